@@ -0,0 +1,272 @@
+"""
+Analytics on top of the processed FTD/KYC dataframe.
+
+Everything here works on whole columns or matrices at once (NumPy/pandas),
+never one source or one cohort at a time, so results stay fast on
+full-history exports and can be cached per dataset by the UI.
+"""
+
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# Conversion windows reported for every cohort
+COHORT_WINDOWS = (30, 60, 90)
+# Longest time-to-convert tracked in the cumulative curves
+MAX_COHORT_DAYS = 180
+
+
+def build_cohorts(df, category, max_days=MAX_COHORT_DAYS, distinct=None):
+    """
+    KYC -> FTD time-to-convert cohorts per (kyc_month, category), in one vectorized pass.
+
+    ``category`` is a Series aligned with ``df`` (e.g. the source category of each record). With ``distinct``
+    (e.g. CLIENT_KEY) a client with several rows counts once per cohort, converting at its earliest FTD.
+    Returns a dict with:
+    - ``summary``: cohort size, converted clients, % converted within 30/60/90 days,
+      median and mean days to convert
+    - ``histogram``: clients converting on each day 0..max_days after KYC (one column per day)
+    """
+    ftd_col = df.attrs.get("ftd_date_col", "portal - ftd_time")
+    kyc_col = df.attrs.get("kyc_date_col", "DATE_CREATED")
+
+    valid = df[kyc_col].notna().to_numpy()
+    kyc_dates = df[kyc_col].to_numpy()[valid]
+    ftd_dates = df[ftd_col].to_numpy()[valid]
+    # Time of day is ignored; an FTD stamped before its KYC counts as day 0
+    days = (ftd_dates.astype("datetime64[D]") - kyc_dates.astype("datetime64[D]")).astype("float64")
+    days[np.isnat(ftd_dates)] = np.nan
+    days = np.clip(days, 0, None)
+
+    keys = pd.MultiIndex.from_arrays(
+        [df["kyc_month"].to_numpy()[valid], category.to_numpy()[valid]], names=["kyc_month", "category"]
+    )
+    codes, cohorts = pd.factorize(keys, sort=True)
+    n_cohorts = len(cohorts)
+    if distinct is not None:
+        per_client = pd.DataFrame({"cohort": codes, "client": df[distinct].to_numpy()[valid], "days": days})
+        per_client = per_client.groupby(["cohort", "client"], sort=False)["days"].min()
+        codes = per_client.index.get_level_values("cohort").to_numpy()
+        days = per_client.to_numpy()
+
+    sizes = np.bincount(codes, minlength=n_cohorts)
+    converted = ~np.isnan(days)
+    within = converted & (days <= max_days)
+    flat = codes[within] * (max_days + 1) + days[within].astype(np.int64)
+    histogram = np.bincount(flat, minlength=n_cohorts * (max_days + 1)).reshape(n_cohorts, max_days + 1)
+    cumulative = histogram.cumsum(axis=1)
+
+    summary = pd.DataFrame(index=pd.MultiIndex.from_tuples(list(cohorts), names=["kyc_month", "category"]))
+    summary["kyc_clients"] = sizes
+    summary["ftd_clients"] = np.bincount(codes[converted], minlength=n_cohorts)
+    for window in COHORT_WINDOWS:
+        summary[f"conv_{window}d"] = np.where(sizes > 0, cumulative[:, min(window, max_days)] / np.maximum(sizes, 1) * 100, 0.0)
+    conversion_days = pd.Series(days[converted]).groupby(codes[converted])
+    summary["median_days"] = conversion_days.median().reindex(range(n_cohorts)).to_numpy()
+    summary["mean_days"] = conversion_days.mean().reindex(range(n_cohorts)).to_numpy()
+
+    histogram = pd.DataFrame(histogram, index=summary.index, columns=pd.RangeIndex(max_days + 1, name="days"))
+    return {"summary": summary, "histogram": histogram}
+
+
+def cohort_curves(cohorts, months=None):
+    """
+    Cumulative conversion % by days since KYC for each category, pooling the given KYC months.
+    Returns long format: category, days, conversion_rate.
+    """
+    summary = cohorts["summary"]
+    histogram = cohorts["histogram"]
+    if months is not None:
+        mask = summary.index.get_level_values("kyc_month").isin(months)
+        summary = summary[mask]
+        histogram = histogram[mask]
+    if summary.empty:
+        return pd.DataFrame(columns=["category", "days", "conversion_rate"])
+
+    sizes = summary["kyc_clients"].groupby(level="category").sum()
+    cumulative = histogram.groupby(level="category").sum().cumsum(axis=1)
+    rates = cumulative.div(sizes.where(sizes > 0), axis=0).fillna(0) * 100
+    return rates.stack().rename("conversion_rate").reset_index()
+
+
+# Months projected ahead by default (next quarter)
+FORECAST_HORIZON = 3
+# Months of history needed before a month-of-year seasonal term is fitted
+SEASONAL_MIN_MONTHS = 24
+
+
+def _month_number(months):
+    """Months since year 0, so gaps between selected months keep their real spacing"""
+    months = pd.DatetimeIndex(months)
+    return np.asarray(months.year * 12 + months.month - 1, dtype=np.int64)
+
+
+def _design(month_numbers, origin, seasonal):
+    """Shared regression design: intercept, linear trend and (optionally) month-of-year dummies"""
+    columns = [np.ones(len(month_numbers)), (month_numbers - origin).astype("float64")]
+    if seasonal:
+        month_of_year = month_numbers % 12
+        columns += [(month_of_year == m).astype("float64") for m in range(1, 12)]
+    return np.column_stack(columns)
+
+
+def forecast_series(counts, series_col, horizon=FORECAST_HORIZON, value_col="clients", time_col="ftd_month", level=0.95):
+    """
+    Linear trend (+ month-of-year seasonality once there are SEASONAL_MIN_MONTHS of history and enough
+    months to fit it) forecast for every series of the monthly counts at once: all series share one design
+    matrix, so the fit is a single least-squares solve over the month x series matrix.
+
+    Returns long format: time_col, series_col, forecast, lower, upper (``level`` prediction interval,
+    clipped at 0), for the ``horizon`` months after the last month in ``counts``.
+    """
+    columns = [time_col, series_col, "forecast", "lower", "upper"]
+    matrix = counts.pivot_table(index=time_col, columns=series_col, values=value_col, aggfunc="sum", fill_value=0).sort_index()
+    month_numbers = _month_number(matrix.index)
+    seasonal = month_numbers[-1] - month_numbers[0] + 1 >= SEASONAL_MIN_MONTHS if len(month_numbers) else False
+    X = _design(month_numbers, month_numbers[0] if len(month_numbers) else 0, seasonal)
+    n, p = X.shape
+    if seasonal and n <= p:
+        # A sparse selection can span two years with too few months for the seasonal terms: trend only
+        seasonal = False
+        X = _design(month_numbers, month_numbers[0], seasonal)
+        n, p = X.shape
+    if n <= p or matrix.shape[1] == 0:
+        return pd.DataFrame(columns=columns)
+
+    Y = matrix.to_numpy(dtype="float64")
+    beta, _, _, _ = np.linalg.lstsq(X, Y, rcond=None)
+    residuals = Y - X @ beta
+    sigma = np.sqrt((residuals ** 2).sum(axis=0) / (n - p))
+
+    future_numbers = month_numbers[-1] + np.arange(1, horizon + 1)
+    X_future = _design(future_numbers, month_numbers[0], seasonal)
+    point = X_future @ beta
+    # Prediction standard error: residual noise plus parameter uncertainty at each future month
+    leverage = np.einsum("ij,jk,ik->i", X_future, np.linalg.pinv(X.T @ X), X_future)
+    z = NormalDist().inv_cdf(0.5 + level / 2)
+    spread = z * np.sqrt(1 + leverage)[:, None] * sigma[None, :]
+
+    future_months = pd.to_datetime({"year": future_numbers // 12, "month": future_numbers % 12 + 1, "day": 1})
+    return pd.DataFrame({
+        time_col: np.repeat(future_months.to_numpy(), matrix.shape[1]),
+        series_col: np.tile(matrix.columns.to_numpy(), horizon),
+        "forecast": np.clip(point, 0, None).ravel(),
+        "lower": np.clip(point - spread, 0, None).ravel(),
+        "upper": np.clip(point + spread, 0, None).ravel(),
+    }, columns=columns)
+
+
+# Robust z-score above which a cell is flagged (3.5 is the usual cut-off for MAD-based scores)
+ANOMALY_THRESHOLD = 3.5
+# Periods of history a series needs before its cells are scored
+ANOMALY_MIN_PERIODS = 6
+# Scales MAD / mean absolute deviation to the standard deviation of normal data
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+
+
+def anomaly_scores(counts, series_col, value_col="clients", time_col="ftd_month", threshold=ANOMALY_THRESHOLD, exclude=()):
+    """
+    Robust z-score of every period x series cell against its own series: (value - median) / scaled MAD,
+    computed for the whole matrix at once. Series whose MAD is 0 (mostly-constant or sparse) fall back to
+    the mean absolute deviation; completely flat series score 0. Periods in ``exclude`` (e.g. incomplete
+    ones) are neither scored nor used for the medians.
+
+    Returns long format: time_col, series_col, value_col, median, score, is_anomaly.
+    """
+    columns = [time_col, series_col, value_col, "median", "score", "is_anomaly"]
+    matrix = counts.pivot_table(index=time_col, columns=series_col, values=value_col, aggfunc="sum", fill_value=0).sort_index()
+    matrix = matrix[~matrix.index.isin(list(exclude))]
+    if len(matrix) < ANOMALY_MIN_PERIODS or matrix.shape[1] == 0:
+        return pd.DataFrame(columns=columns)
+
+    values = matrix.to_numpy(dtype="float64")
+    median = np.median(values, axis=0)
+    deviation = np.abs(values - median)
+    scale = MAD_SCALE * np.median(deviation, axis=0)
+    scale = np.where(scale > 0, scale, MEAN_AD_SCALE * deviation.mean(axis=0))
+    scores = np.divide(values - median, scale, out=np.zeros_like(values), where=scale > 0)
+
+    n_periods, n_series = values.shape
+    return pd.DataFrame({
+        time_col: np.repeat(matrix.index.to_numpy(), n_series),
+        series_col: np.tile(matrix.columns.to_numpy(), n_periods),
+        value_col: values.ravel(),
+        "median": np.tile(median, n_periods),
+        "score": scores.ravel(),
+        "is_anomaly": np.abs(scores.ravel()) >= threshold,
+    }, columns=columns)
+
+
+def top_anomalies(scores, series_col, n=20):
+    """Series ranked by their most extreme flagged cell: series, flagged periods, and the worst cell"""
+    flagged = scores[scores["is_anomaly"]]
+    if flagged.empty:
+        return flagged
+    worst = flagged.loc[flagged["score"].abs().sort_values(ascending=False, kind="stable").index]
+    summary = worst.drop_duplicates(series_col).set_index(series_col)
+    summary["flagged_periods"] = flagged.groupby(series_col).size()
+    return summary.head(n).reset_index()
+
+
+# Rolling windows (in months) reported for every series
+ROLLING_WINDOWS = (3, 6, 12)
+
+
+class PrefixSums:
+    """
+    Cumulative counts over the dense calendar-month x series matrix (months missing from ``counts`` are 0).
+    Any window sum is the difference of two rows, so it costs O(1) per series whatever its length.
+    """
+
+    def __init__(self, counts, series_col, value_col="clients", time_col="ftd_month", series=None, months=None):
+        """``series`` and ``months`` (optional) are added to the matrix with zero counts when ``counts`` lacks them"""
+        self.series_col = series_col
+        self.value_col = value_col
+        self.time_col = time_col
+        matrix = counts.pivot_table(index=time_col, columns=series_col, values=value_col, aggfunc="sum", fill_value=0).sort_index()
+        if series is not None:
+            matrix = matrix.reindex(columns=matrix.columns.union(pd.Index(series), sort=False), fill_value=0)
+        covered = matrix.index.append(pd.DatetimeIndex(list(months or [])))
+        if len(covered) > 0:
+            matrix = matrix.reindex(pd.date_range(covered.min(), covered.max(), freq="MS"), fill_value=0)
+        self.months = pd.DatetimeIndex(matrix.index)
+        self.series = matrix.columns
+        self.values = matrix.to_numpy(dtype="float64")
+        self.cumulative = np.vstack([np.zeros((1, len(self.series))), self.values.cumsum(axis=0)])
+
+    def window(self, start, end):
+        """Sum per series over the months start..end (inclusive), clamped to the months covered"""
+        first = self.months.searchsorted(pd.Timestamp(start), side="left")
+        last = self.months.searchsorted(pd.Timestamp(end), side="right")
+        return pd.Series(self.cumulative[max(last, first)] - self.cumulative[first], index=self.series)
+
+    def metrics(self, windows=ROLLING_WINDOWS):
+        """
+        Per month and series: the month's value, trailing ``windows`` sums (NaN until a full window of
+        history exists), year-to-date, the same month last year and the year-over-year change in %.
+        """
+        n_months, n_series = self.values.shape
+        positions = np.arange(n_months)
+        result = {
+            self.time_col: np.repeat(self.months.to_numpy(), n_series),
+            self.series_col: np.tile(self.series.to_numpy(), n_months),
+            self.value_col: self.values.ravel(),
+        }
+        for months in windows:
+            sums = self.cumulative[positions + 1] - self.cumulative[np.maximum(positions + 1 - months, 0)]
+            sums[positions + 1 < months] = np.nan
+            result[f"rolling_{months}m"] = sums.ravel()
+
+        year_start = np.maximum(positions - (self.months.month.to_numpy() - 1), 0)
+        result["ytd"] = (self.cumulative[positions + 1] - self.cumulative[year_start]).ravel()
+
+        last_year = np.full_like(self.values, np.nan)
+        if n_months > 12:
+            last_year[12:] = self.values[:-12]
+        result["last_year"] = last_year.ravel()
+        result["yoy_pct"] = np.divide(
+            self.values - last_year, last_year, out=np.full_like(self.values, np.nan), where=last_year > 0
+        ).ravel() * 100
+        return pd.DataFrame(result)
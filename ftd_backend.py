@@ -0,0 +1,351 @@
+"""
+Dataframe backends for the FTD dashboard.
+
+The load/filter/aggregate steps (DD/MM/YYYY date parsing, month x source
+counts, comparison merges) are implemented once per backend so the UI can
+switch execution engine without changing results:
+
+- ``pandas`` (default): plain pandas, always available.
+- ``polars``: Arrow-native, multi-threaded; used when ``polars`` is installed.
+
+Select the backend with the ``FTD_BACKEND`` environment variable. Run
+``python ftd_backend.py source.csv`` to benchmark both paths on a real export.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError:  # polars is optional
+    pl = None
+
+BACKEND_ENV_VAR = "FTD_BACKEND"
+DEFAULT_BACKEND = "pandas"
+
+# Dates outside this window are treated as invalid (placeholders, typos)
+MIN_VALID_DATE = pd.Timestamp("2023-01-01")
+MAX_VALID_DATE = pd.Timestamp("2026-12-31")
+
+# Integer key per distinct Record ID, added at load so counts can be made distinct-client counts
+CLIENT_KEY = "client_key"
+
+# DD/MM/YYYY or DD-MM-YYYY at the start of the value; any time part is ignored
+DATE_PATTERN = r"^\s*(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})\b"
+
+
+def _four_digit_year(year):
+    """Expand 2-digit years (00-29 -> 20xx, 30-99 -> 19xx; the 19xx ones fall outside the valid window)"""
+    year = year.mask(year < 30, year + 2000)
+    return year.mask(year < 100, year + 1900)
+
+
+def _fill_counts(merged, left, right, on):
+    """Zero-fill the value columns of an outer join and restore their original dtypes"""
+    dtypes = {c: frame[c].dtype for frame in (left, right) for c in frame.columns if c not in on}
+    return merged.fillna({col: 0 for col in dtypes}).astype(dtypes)
+
+
+class PandasBackend:
+    """Reference implementation - every other backend must match its output exactly"""
+
+    name = "pandas"
+
+    def parse_dates(self, values):
+        """Parse a Series of DD/MM/YYYY strings into datetimes, NaT when unparseable"""
+        parts = values.astype("string").str.extract(DATE_PATTERN)
+        day = pd.to_numeric(parts[0], errors="coerce")
+        month = pd.to_numeric(parts[1], errors="coerce")
+        year = _four_digit_year(pd.to_numeric(parts[2], errors="coerce"))
+
+        iso = (
+            year.astype("Int64").astype("string").str.zfill(4) + "-"
+            + month.astype("Int64").astype("string").str.zfill(2) + "-"
+            + day.astype("Int64").astype("string").str.zfill(2)
+        )
+        parsed = pd.to_datetime(iso, format="%Y-%m-%d", errors="coerce")
+        return pd.Series(parsed, index=values.index, name=values.name).astype("datetime64[ns]")
+
+    def count_by(self, df, keys, name="clients", distinct=None):
+        """
+        Row counts per key combination (equivalent of groupby(keys)["Record ID"].size()).
+        With ``distinct`` (e.g. CLIENT_KEY) each value of that column is counted once per combination.
+        """
+        if distinct is not None:
+            df = df.drop_duplicates([*keys, distinct])
+        if len(df) == 0:
+            return pd.DataFrame({**{k: df[k] for k in keys}, name: pd.Series(dtype="int64")})
+        return df.groupby(keys).size().reset_index(name=name).astype({name: "int64"})
+
+    def sum_by(self, df, keys, value_col="clients"):
+        """Sum of a value column per key combination (re-aggregating pre-computed counts)"""
+        return df.groupby(keys)[value_col].sum().reset_index().astype({value_col: df[value_col].dtype})
+
+    def densify(self, counts, grid, value_cols):
+        """Left-join counts onto the full product of the grid values, filling gaps with 0"""
+        full = pd.MultiIndex.from_product(list(grid.values()), names=list(grid.keys())).to_frame(index=False)
+        full = full.astype({k: counts[k].dtype for k in grid})
+        dense = full.merge(counts, on=list(grid.keys()), how="left")
+        return dense.fillna({col: 0 for col in value_cols}).astype({col: counts[col].dtype for col in value_cols})
+
+    def merge_counts(self, left, right, on):
+        """Outer-join two count frames on the given keys, filling gaps with 0"""
+        merged = left.merge(right, on=on, how="outer")
+        return _fill_counts(merged, left, right, on).sort_values(on, ignore_index=True)
+
+
+class PolarsBackend(PandasBackend):
+    """Polars execution path - frames are converted at the boundary, results returned as pandas"""
+
+    name = "polars"
+
+    def parse_dates(self, values):
+        parts = pl.Series(values.name, values.astype("string").to_numpy(dtype=object, na_value=None), dtype=pl.Utf8)
+        frame = parts.str.extract_groups(DATE_PATTERN).struct.unnest()
+        day, month, year = (frame.get_column(c).cast(pl.Int64, strict=False) for c in frame.columns)
+        year = (
+            pl.when(year >= 100).then(year)
+            .when(year >= 30).then(year + 1900)
+            .otherwise(year + 2000)
+        )
+        iso = pl.select(
+            pl.concat_str([
+                year.cast(pl.Utf8).str.zfill(4),
+                month.cast(pl.Utf8).str.zfill(2),
+                day.cast(pl.Utf8).str.zfill(2),
+            ], separator="-")
+            .str.to_datetime("%Y-%m-%d", strict=False, time_unit="ns")
+        ).to_series()
+        return pd.Series(iso.to_numpy(), index=values.index, name=values.name).astype("datetime64[ns]")
+
+    def count_by(self, df, keys, name="clients", distinct=None):
+        if len(df) == 0:
+            return super().count_by(df, keys, name)
+        frame = pl.from_pandas(df[keys + ([distinct] if distinct is not None else [])])
+        if distinct is not None:
+            frame = frame.unique(subset=keys + [distinct])
+        result = (
+            frame
+            .drop_nulls(keys)
+            .group_by(keys)
+            .agg(pl.len().cast(pl.Int64).alias(name))
+            .sort(keys)
+            .to_pandas()
+        )
+        return result.astype({k: df[k].dtype for k in keys})
+
+    def sum_by(self, df, keys, value_col="clients"):
+        if len(df) == 0:
+            return super().sum_by(df, keys, value_col)
+        result = (
+            pl.from_pandas(df[keys + [value_col]])
+            .drop_nulls(keys)
+            .group_by(keys)
+            .agg(pl.col(value_col).sum())
+            .sort(keys)
+            .to_pandas()
+        )
+        return result.astype({k: df[k].dtype for k in keys + [value_col]})
+
+    def densify(self, counts, grid, value_cols):
+        keys = list(grid.keys())
+        full = pl.DataFrame({keys[0]: pd.Series(grid[keys[0]], dtype=counts[keys[0]].dtype)})
+        for key in keys[1:]:
+            full = full.join(pl.DataFrame({key: pd.Series(grid[key], dtype=counts[key].dtype)}), how="cross")
+        dense = (
+            full.join(pl.from_pandas(counts), on=keys, how="left", maintain_order="left")
+            .with_columns([pl.col(col).fill_null(0) for col in value_cols])
+            .to_pandas()
+        )
+        return dense.astype({k: counts[k].dtype for k in keys})
+
+    def merge_counts(self, left, right, on):
+        merged = (
+            pl.from_pandas(left)
+            .join(pl.from_pandas(right), on=on, how="full", coalesce=True)
+            .sort(on)
+            .to_pandas()
+        )
+        return _fill_counts(merged, left, right, on).astype({k: left[k].dtype for k in on})
+
+
+BACKENDS = {"pandas": PandasBackend, "polars": PolarsBackend}
+
+
+def available_backends():
+    """Names of the backends that can run in this environment"""
+    return [name for name in BACKENDS if name != "polars" or pl is not None]
+
+
+def get_backend(name=None):
+    """Return the configured backend, falling back to pandas when the requested one is unavailable"""
+    name = (name or os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND)).strip().lower()
+    if name not in available_backends():
+        name = DEFAULT_BACKEND
+    return BACKENDS[name]()
+
+
+# Excel stores dates as days since 1899-12-30; serial 25569 (1970-01-01) is the CRM's "no date" placeholder
+EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+EXCEL_NULL_SERIAL = 25569
+
+
+def excel_serial_to_datetime(values):
+    """Vectorized Excel serial -> date (time of day dropped, as in parse_dates); serials <= 25569 become NaT"""
+    serials = pd.to_numeric(values, errors="coerce")
+    serials = serials.where(serials > EXCEL_NULL_SERIAL)
+    return (EXCEL_EPOCH + pd.to_timedelta(np.floor(serials), unit="D")).astype("datetime64[ns]")
+
+
+def fill_excel_serials(parsed, raw):
+    """Fill dates parse_dates could not read from Excel serials in the raw values (numeric cells of an xlsx)"""
+    missing = parsed.isna() & raw.notna()
+    if not missing.any():
+        return parsed
+    return parsed.mask(missing, excel_serial_to_datetime(raw[missing]))
+
+
+def client_keys(ids):
+    """
+    Integer key per distinct Record ID (hash-based factorize); rows without an ID each get a key of their own,
+    since they cannot be matched to another row.
+    """
+    ids = ids.astype("string").str.strip()
+    codes, uniques = pd.factorize(ids.where(ids != ""))
+    missing = codes < 0
+    codes = codes.astype("int64")
+    codes[missing] = len(uniques) + np.arange(missing.sum())
+    return pd.Series(codes, index=ids.index, name=CLIENT_KEY)
+
+
+class RecordIndex:
+    """
+    Row positions sorted by (month, key) so the records behind any month x source (or country)
+    cell are one contiguous slice: lookups cost O(result) instead of a scan of the frame.
+    """
+
+    def __init__(self, months, keys):
+        month_codes, self.months = pd.factorize(months, sort=True)
+        key_codes, self.keys = pd.factorize(keys, sort=True)
+        n_cells = len(self.months) * len(self.keys)
+        cells = np.where((month_codes >= 0) & (key_codes >= 0), month_codes * len(self.keys) + key_codes, -1)
+        self.order = np.argsort(cells, kind="stable")
+        # bounds[c]:bounds[c + 1] is the slice of self.order holding cell c
+        self.bounds = np.searchsorted(cells[self.order], np.arange(n_cells + 1))
+
+    def _cells(self, month, keys):
+        month_code = self.months.get_indexer([month])[0]
+        key_codes = self.keys.get_indexer(list(keys))
+        if month_code < 0:
+            return []
+        return [month_code * len(self.keys) + k for k in key_codes if k >= 0]
+
+    def positions(self, month, keys):
+        """Row positions (for df.iloc) of every record in the given month for any of the keys"""
+        slices = [self.order[self.bounds[c]:self.bounds[c + 1]] for c in self._cells(month, keys)]
+        return np.sort(np.concatenate(slices)) if slices else np.array([], dtype=np.int64)
+
+    def count(self, month, keys):
+        """Number of records in the given month for any of the keys, without materializing them"""
+        return int(sum(self.bounds[c + 1] - self.bounds[c] for c in self._cells(month, keys)))
+
+
+def period_start(dates, granularity):
+    """Start of the day ("D"), ISO week - Monday - ("W") or month ("M") containing each date"""
+    if granularity == "D":
+        return dates.dt.normalize()
+    if granularity == "W":
+        return dates.dt.normalize() - pd.to_timedelta(dates.dt.weekday, unit="D")
+    return dates.dt.to_period("M").dt.to_timestamp()
+
+
+def periods_in_months(months, granularity):
+    """Every period start (day / week / month) overlapping the given months, sorted"""
+    if not months:
+        return []
+    days = pd.DatetimeIndex(sorted({d for m in months for d in pd.date_range(m, m + pd.offsets.MonthEnd(0), freq="D")}))
+    return sorted(period_start(days.to_series(), granularity).unique())
+
+
+def incomplete_periods(periods, granularity, months, first_date, last_date):
+    """
+    Periods the data does not fully cover: those reaching before the first or past the last day with data
+    (an export that starts or ends mid-month), and weeks reaching into a month that is not selected (only
+    the days of selected months are counted). Their counts are partial, so they should not be compared
+    with complete periods.
+    """
+    if len(periods) == 0 or pd.isna(first_date) or pd.isna(last_date):
+        return []
+    starts = pd.DatetimeIndex(periods)
+    step = {"D": pd.DateOffset(days=1), "W": pd.DateOffset(days=7), "M": pd.DateOffset(months=1)}[granularity]
+    last_days = starts + step - pd.Timedelta(days=1)
+    partial = (starts < pd.Timestamp(first_date).normalize()) | (last_days > pd.Timestamp(last_date).normalize())
+    if granularity == "W":
+        selected = pd.DatetimeIndex(months)
+        partial |= ~starts.to_period("M").to_timestamp().isin(selected) | ~last_days.to_period("M").to_timestamp().isin(selected)
+    return starts[partial].tolist()
+
+
+def build_rollups(df, date_col, month_col, dims, backend=None, distinct=None):
+    """
+    Record counts per (month, period, *dims) at daily, weekly and monthly granularity.
+    The month column is kept so the dashboard's month filter still applies to day/week rollups.
+    ``distinct`` is passed on to count_by (count each client once per cell).
+    """
+    backend = backend or get_backend()
+    valid = df[month_col].notna()
+    frame = df.loc[valid, dims + ([distinct] if distinct is not None else [])].copy()
+    frame["month"] = df.loc[valid, month_col]
+    rollups = {}
+    for granularity in ("D", "W", "M"):
+        frame["period"] = period_start(df.loc[valid, date_col], granularity)
+        rollups[granularity] = backend.count_by(frame, ["month", "period"] + dims, distinct=distinct)
+    return rollups
+
+
+def benchmark_backends(df, date_col, source_col, repeat=3):
+    """Time parse/count/merge on every available backend and check results match pandas"""
+    reference = PandasBackend()
+    rows = []
+    for name in available_backends():
+        backend = get_backend(name)
+        timings = {}
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            parsed = backend.parse_dates(df[date_col])
+        timings["parse_dates"] = (time.perf_counter() - start) / repeat
+
+        frame = pd.DataFrame({
+            "month": parsed.dt.to_period("M").dt.to_timestamp(),
+            source_col: df[source_col].fillna("(Unknown)"),
+        }).dropna(subset=["month"])
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            counts = backend.count_by(frame, ["month", source_col])
+        timings["count_by"] = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            merged = backend.merge_counts(counts, counts.rename(columns={"clients": "other"}), ["month", source_col])
+        timings["merge_counts"] = (time.perf_counter() - start) / repeat
+
+        identical = (
+            parsed.equals(reference.parse_dates(df[date_col]))
+            and counts.equals(reference.count_by(frame, ["month", source_col]))
+            and merged.equals(reference.merge_counts(counts, counts.rename(columns={"clients": "other"}), ["month", source_col]))
+        )
+        rows.append({"backend": name, **{k: round(v * 1000, 2) for k, v in timings.items()}, "identical": identical})
+    return pd.DataFrame(rows).set_index("backend")
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "source.csv"
+    raw = pd.read_csv(path, dtype=str)
+    print(f"Benchmarking {len(raw):,} rows from {path} (times in ms)")
+    print(benchmark_backends(raw, "portal - ftd_time", "portal - source_marketing_campaign").to_string())
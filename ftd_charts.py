@@ -0,0 +1,65 @@
+"""
+Chart and table helpers for the FTD dashboard.
+
+These shape the aggregated long-format counts before they are handed to
+Altair or st.dataframe, so what is sent to the browser stays small no matter
+how many sources are selected.
+"""
+
+import math
+
+import pandas as pd
+
+OTHER_LABEL = "📦 Other"
+DEFAULT_MAX_SERIES = 10
+DEFAULT_PIVOT_COLUMNS = 20
+TOTAL_LABEL = "📊 TOTAL"
+SERIES_PALETTE = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"]
+OTHER_COLOR = "#b0b0b0"
+
+
+def fold_top_n(counts, series_col, n=DEFAULT_MAX_SERIES, value_col="clients", time_col="ftd_month", other_label=OTHER_LABEL):
+    """
+    Keep the ``n`` series with the largest totals and sum every other series into one ``other_label`` series.
+    Returns (folded counts, kept series names in descending total order).
+    """
+    totals = counts.groupby(series_col, sort=False)[value_col].sum().sort_values(ascending=False, kind="stable")
+    if len(totals) <= n:
+        return counts, totals.index.tolist()
+
+    kept = totals.index[:n]
+    is_kept = counts[series_col].isin(kept)
+    top = counts.loc[is_kept, [time_col, series_col, value_col]]
+    other = counts.loc[~is_kept].groupby(time_col, as_index=False)[value_col].sum()
+    other[series_col] = other_label
+    return pd.concat([top, other], ignore_index=True), kept.tolist()
+
+
+def series_colors(series):
+    """Palette colors for the given series names, cycling the palette; the folded "Other" series is always grey"""
+    colors = []
+    for name in series:
+        colors.append(OTHER_COLOR if name == OTHER_LABEL else SERIES_PALETTE[len(colors) % len(SERIES_PALETTE)])
+    return colors
+
+
+def pivot_page(counts, series_col, page=0, page_size=DEFAULT_PIVOT_COLUMNS, value_col="clients", time_col="ftd_month"):
+    """
+    One page of the period x series pivot, with series ordered by total (page 0 = top ``page_size``).
+    Only the rows of the requested series are pivoted; the TOTAL column still covers every series.
+    Returns (pivot, number of pages).
+    """
+    totals = counts.groupby(series_col)[value_col].sum().sort_values(ascending=False, kind="stable")
+    n_pages = max(1, math.ceil(len(totals) / page_size))
+    page = min(max(page, 0), n_pages - 1)
+    columns = totals.index[page * page_size:(page + 1) * page_size]
+
+    page_counts = counts[counts[series_col].isin(columns)]
+    pivot = (
+        page_counts.pivot_table(index=time_col, columns=series_col, values=value_col, fill_value=0, aggfunc="sum")
+        .reindex(columns=columns, fill_value=0)
+        .sort_index()
+    )
+    if len(totals) > 1:
+        pivot[TOTAL_LABEL] = counts.groupby(time_col)[value_col].sum().reindex(pivot.index, fill_value=0)
+    return pivot, n_pages
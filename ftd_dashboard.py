@@ -3,6 +3,22 @@ import streamlit as st
 import streamlit.components.v1 as components
 import pandas as pd
 import numpy as np
+import sqlite3
+import os
+from collections import OrderedDict
+import logging
+from ftd_backend import get_backend, build_rollups, periods_in_months, incomplete_periods, RecordIndex, CLIENT_KEY
+from ftd_store import save_upload, list_uploads, load_upload, delete_upload, month_counts
+from ftd_snapshot import diff_snapshots
+from ftd_analytics import build_cohorts, cohort_curves, forecast_series, anomaly_scores, top_anomalies, PrefixSums, COHORT_WINDOWS, FORECAST_HORIZON, ANOMALY_THRESHOLD
+from ftd_ingest import load_dataset, upload_key, configure_logging, format_diagnostics, UPLOAD_TYPES, DUPLICATE_FLAG
+from ftd_watch import DataWatcher, local_source_files, DATA_DIR_ENV_VAR, POLL_INTERVAL_ENV_VAR, DEFAULT_POLL_SECONDS
+from ftd_taxonomy import get_taxonomy, build_hierarchy
+from ftd_charts import fold_top_n, series_colors, pivot_page, OTHER_LABEL, DEFAULT_MAX_SERIES, DEFAULT_PIVOT_COLUMNS
+from ftd_sketch import build_sketches, hll_standard_error
+
+logger = logging.getLogger("ftd.dashboard")
+configure_logging()
 
 def safe_int_convert(value, default=0):
     """Safely convert value to int with fallback for None/NaN values"""
@@ -15,6 +31,16 @@ def safe_int_convert(value, default=0):
 
 st.set_page_config(page_title="FTD Acquisition Dashboard", layout="wide")
 
+@st.cache_resource(show_spinner=False)
+def get_data_watcher(data_dir, backend_name):
+    """Watcher of the local export files, shared by all sessions; it starts loading as soon as it is created"""
+    interval = float(os.environ.get(POLL_INTERVAL_ENV_VAR, DEFAULT_POLL_SECONDS))
+    return DataWatcher(lambda: local_source_files(data_dir), get_backend(backend_name), interval).start()
+
+# Pre-warm: start loading the local exports in the background on the first page view (before login),
+# so the dashboard already has them parsed when it is opened
+get_data_watcher(os.environ.get(DATA_DIR_ENV_VAR), get_backend().name)
+
 # Password Protection
 def check_password():
     """Returns `True` if the user had the correct password."""
@@ -169,7 +195,7 @@ elif dashboard_type == "KYC Dashboard":
     metric_name = "KYC'd Clients"
 else:  # KYC & FTD Comparison
     st.title("KYC & FTD Comparison Dashboard")
-    st.caption("Compare KYC and FTD conversions by source type (IB Sources, Organic, Marketing). Shows conversion rates and trends.")
+    st.caption("Compare KYC and FTD conversions by source type (the source taxonomy categories). Shows conversion rates and trends.")
     date_column = None  # Will use both columns
     metric_name = "Conversions"
 
@@ -283,9 +309,11 @@ with st.expander("📚 **CSV Format Guide & Instructions**", expanded=False):
         st.markdown("#### 📊 Source Grouping Logic")
         st.markdown("""
         When grouping is enabled:
-        - **🏦 IB Sources**: Contains "IB" in name
+        - **🏦 IB Sources**: Names like `IB-18050050`, `IB_Partner_John` or with a separate `IB` token (not just the letters "ib", so `Tribe_Campaign` is Marketing)
         - **🌱 Organic**: Unknown/empty sources
-        - **📢 Marketing**: All other sources
+        - **📢 Marketing**: All other sources, split into channels (Google, Meta, Mobile, ...)
+        
+        The rules are in `source_taxonomy.json` and can be edited without changing the code.
         """)
         
         st.warning("""
@@ -363,274 +391,147 @@ with st.expander("📚 **CSV Format Guide & Instructions**", expanded=False):
         """)
 
 # --- Load data ---
-uploaded = st.file_uploader("Upload CSV (must include both date columns and source column)", type=["csv"])
+uploaded = st.file_uploader("Upload CSV or Excel files (must include both date columns and source column)",
+                            type=UPLOAD_TYPES, accept_multiple_files=True,
+                            help="Exports split by region can be uploaded together; records repeated across files are counted once (by Record ID). "
+                                 "Compressed exports (.csv.gz, .csv.zst, .zip) are accepted too.")
+
+# Dataframe engine for parsing/aggregation (set FTD_BACKEND=polars to switch)
+backend = get_backend()
+
+# --- Upload history (snapshots stored in the local SQLite file) ---
+# Months of a snapshot opened by default (the default sidebar year plus the year before it, for year-over-year)
+SNAPSHOT_DEFAULT_MONTHS = 24
+
+@st.cache_data(show_spinner=False)
+def load_snapshot(upload_id, month_cols=None, start=None, end=None):
+    """Load a stored snapshot (only the columns the dashboard needs), optionally only the records in a month range"""
+    return load_upload(upload_id, month_cols, start, end)
 
-def parse_dd_mm_yyyy_date(date_str, debug=False):
-    """Force DD/MM/YYYY parsing - NO AMERICAN FORMAT"""
+@st.cache_data(show_spinner=False)
+def load_snapshot_months(upload_id, month_cols):
+    """Months present in a snapshot's month columns, aggregated in SQLite without loading any records"""
+    months = [month_counts(upload_id, month_col)[month_col] for month_col in month_cols]
+    return sorted(set(pd.concat(months)))
+
+# Month columns the current dashboard counts by; a snapshot is read only for records with a month in range there
+snapshot_month_cols = {"FTD Dashboard": ("ftd_month",), "KYC Dashboard": ("kyc_month",)}.get(
+    dashboard_type, ("ftd_month", "kyc_month"))
+selected_snapshot = None
+snapshot_range = None
+with st.expander("🗄️ Upload History", expanded=False):
     try:
-        # Remove any extra whitespace
-        date_str = str(date_str).strip()
-        
-        # Handle NaN/None/empty values AND the string 'NaT'
-        if date_str in ['nan', 'NaN', 'None', '', 'NaT', 'nat', 'NAT', '<NA>', 'null', 'NULL']:
-            if debug:
-                print(f"  Null/NaT value detected: '{date_str}'")
-            return pd.NaT
-            
-        # Handle 1/1/1970 placeholder dates (means "no FTD yet")
-        if date_str == '1/1/1970' or date_str == '01/01/1970' or date_str == '1/01/1970':
-            if debug:
-                print(f"  Skipping placeholder date (no FTD): {date_str}")
-            return pd.NaT
-            
-        # Remove time component if present
-        if ' ' in date_str:
-            date_str = date_str.split(' ')[0]
-        
-        # Split by / or -
-        if '/' in date_str:
-            parts = date_str.split('/')
-        elif '-' in date_str:
-            parts = date_str.split('-')
+        history = list_uploads()
+    except sqlite3.Error as e:
+        history = pd.DataFrame()
+        st.caption(f"⚠️ Upload history unavailable: {e}")
+    if history.empty:
+        st.caption("No saved snapshots yet. Every uploaded CSV is stored here automatically.")
+    else:
+        st.dataframe(history, hide_index=True, width="stretch")
+        snapshot_labels = {
+            row.upload_id: f"#{row.upload_id} {row.name} ({row.uploaded_at}, {row.row_count:,} rows)"
+            for row in history.itertuples()
+        }
+        selected_snapshot = st.selectbox(
+            "📚 Open a saved snapshot instead of the uploaded file",
+            options=[None] + list(snapshot_labels),
+            format_func=lambda upload_id: "— Use uploaded file —" if upload_id is None else snapshot_labels[upload_id],
+            key="selected_snapshot"
+        )
+        if selected_snapshot is not None:
+            snapshot_months = load_snapshot_months(selected_snapshot, snapshot_month_cols)
+            if snapshot_months:
+                snapshot_range = st.select_slider(
+                    "📅 Months to load from the snapshot",
+                    options=snapshot_months,
+                    value=(snapshot_months[max(len(snapshot_months) - SNAPSHOT_DEFAULT_MONTHS, 0)], snapshot_months[-1]),
+                    format_func=lambda month: f"{month:%b %Y}",
+                    help="Only records dated in this range are read from the history database",
+                    key=f"snapshot_range_{selected_snapshot}_{dashboard_type}"
+                )
+        if selected_snapshot is not None and st.button("🗑️ Delete this snapshot", key="delete_snapshot"):
+            delete_upload(selected_snapshot)
+            load_snapshot.clear()
+            load_snapshot_months.clear()
+            del st.session_state["selected_snapshot"]
+            st.rerun()
+
+# --- Snapshot comparison (retroactive CRM edits between two exports) ---
+@st.cache_data(show_spinner=False)
+def compare_snapshots(old_id, new_id, backend_name="pandas"):
+    """Record-level diff of two stored snapshots"""
+    return diff_snapshots(load_snapshot(old_id), load_snapshot(new_id), get_backend(backend_name))
+
+if len(history) >= 2:
+    with st.expander("🔀 Snapshot Comparison", expanded=False):
+        st.caption("Compare two saved exports record by record to spot retroactive CRM edits (new FTD dates, reassigned sources).")
+        snapshot_ids = list(snapshot_labels)
+        diff_col1, diff_col2 = st.columns(2)
+        with diff_col1:
+            old_snapshot = st.selectbox("Older snapshot", snapshot_ids, index=1, format_func=snapshot_labels.get, key="diff_old_snapshot")
+        with diff_col2:
+            new_snapshot = st.selectbox("Newer snapshot", snapshot_ids, index=0, format_func=snapshot_labels.get, key="diff_new_snapshot")
+        
+        if old_snapshot == new_snapshot:
+            st.info("Select two different snapshots to compare.")
         else:
-            if debug:
-                print(f"  No separator found in: {date_str}")
-            return pd.NaT
-            
-        if len(parts) >= 3:
-            day = int(parts[0])    # FIRST part is DAY
-            month = int(parts[1])  # SECOND part is MONTH  
-            year = int(parts[2])   # THIRD part is YEAR
+            diff = compare_snapshots(old_snapshot, new_snapshot, backend.name)
+            d1, d2, d3, d4 = st.columns(4)
+            d1.metric("Added Records", f"{len(diff['added']):,}")
+            d2.metric("Removed Records", f"{len(diff['removed']):,}")
+            d3.metric("FTD Date Changed", f"{len(diff['ftd_changed']):,}")
+            d4.metric("Source Reassigned", f"{len(diff['source_changed']):,}")
             
-            # Handle 2-digit years
-            if year < 100:
-                if year < 30:  # 00-29 -> 2000-2029
-                    year = 2000 + year
-                else:  # 30-99 -> 1930-1999 (but these will be filtered out)
-                    year = 1900 + year
+            diff_tabs = st.tabs(["📊 Delta by Month/Source", "➕ Added", "➖ Removed", "📅 FTD Changes", "🔁 Source Changes"])
+            for tab, key in zip(diff_tabs, ["delta", "added", "removed", "ftd_changed", "source_changed"]):
+                with tab:
+                    if diff[key].empty:
+                        st.caption("No differences.")
+                    else:
+                        st.dataframe(diff[key], hide_index=True, width="stretch")
             
-            # Basic validation
-            if 1 <= day <= 31 and 1 <= month <= 12:
-                # Don't filter by year here, let the main function handle it
-                result = pd.Timestamp(year, month, day)
-                if debug and year < 2020:
-                    print(f"  Parsed but will filter: {date_str} -> {result}")
-                return result
-            else:
-                if debug:
-                    print(f"  Invalid day/month: day={day}, month={month} from {date_str}")
-    except Exception as e:
-        if debug:
-            print(f"  Error parsing '{date_str}': {e}")
-        pass
-    return pd.NaT
+            st.download_button(
+                "📄 Download Delta CSV",
+                data=diff["delta"].to_csv(index=False).encode("utf-8"),
+                file_name=f"snapshot_delta_{old_snapshot}_vs_{new_snapshot}.csv",
+                mime="text/csv"
+            )
 
+# Cached on the content digest of the files (dataset_key); the files themselves (_files) are not hashed on every rerun
 @st.cache_data(show_spinner=False)
-def load_df(file):
-    # Read CSV with ALL columns as strings first to prevent pandas auto-parsing dates incorrectly
-    df = pd.read_csv(file, dtype=str)
-    original_count = len(df)
-    
-    # Create debug info to show in UI
-    debug_info = []
-    
-    # Just show me the first 5 rows of the ENTIRE CSV as-is
-    debug_info.append("📄 RAW CSV DATA - First 5 rows:")
-    debug_info.append(df.head().to_string())
-    
-    # Show EXACT column names (check for extra spaces/characters)  
-    debug_info.append(f"\n📋 EXACT column names: {[repr(col) for col in df.columns]}")
-    
-    # Show first 10 values from the FTD column exactly as they appear
-    ftd_col = 'portal - ftd_time'
-    if ftd_col in df.columns:
-        debug_info.append(f"\n📅 First 10 values from '{ftd_col}':")
-        for i in range(min(10, len(df))):
-            val = df[ftd_col].iloc[i]
-            debug_info.append(f"  Row {i+1}: {repr(val)}")
-    else:
-        debug_info.append(f"\n❌ Column '{ftd_col}' not found!")
-        debug_info.append("Looking for columns containing 'ftd':")
-        for col in df.columns:
-            if 'ftd' in col.lower():
-                debug_info.append(f"  Found: {repr(col)}")
-                debug_info.append(f"    Sample values: {df[col].head(3).tolist()}")
-    
-    # Add summary of placeholder dates
-    placeholder_count = 0
-    if ftd_col in df.columns:
-        placeholder_count = df[ftd_col].isin(['1/1/1970', '01/01/1970', '1/01/1970']).sum()
-        debug_info.append(f"\n📊 FTD DATA SUMMARY:")
-        debug_info.append(f"  Total records: {len(df)}")
-        debug_info.append(f"  Placeholder dates (1/1/1970): {placeholder_count}")
-        debug_info.append(f"  Potential FTD records: {len(df) - placeholder_count}")
-    
-    # Store debug info for display
-    df.attrs['debug_info'] = '\n'.join(debug_info)
-    df.attrs['placeholder_count'] = placeholder_count
-    
-    # Also print to console
-    print('\n'.join(debug_info))
-    
-    # Expected columns - BOTH date columns must be present
-    ftd_date_col = "portal - ftd_time"
-    kyc_date_col = "DATE_CREATED"
-    source_col = "portal - source_marketing_campaign"
-    country_col = "portal - country"
-    
-    # Check for case-insensitive column matching
-    def find_column_case_insensitive(df, col_name):
-        """Find column name with case-insensitive matching"""
-        for col in df.columns:
-            if col.lower() == col_name.lower():
-                return col
-        return None
-    
-    # Find actual column names (handling case differences)
-    actual_ftd_col = find_column_case_insensitive(df, ftd_date_col)
-    actual_kyc_col = find_column_case_insensitive(df, kyc_date_col)
-    actual_source_col = find_column_case_insensitive(df, source_col)
-    actual_country_col = find_column_case_insensitive(df, country_col)
-    
-    # Check all required columns exist
-    missing_cols = []
-    if not actual_ftd_col:
-        missing_cols.append(ftd_date_col)
-    if not actual_kyc_col:
-        missing_cols.append(kyc_date_col)
-    if not actual_source_col:
-        missing_cols.append(source_col)
-    if not actual_country_col:
-        missing_cols.append(country_col)
-    
-    if missing_cols:
-        raise ValueError(f"CSV is missing required columns: {missing_cols}. Found columns: {list(df.columns)}")
-    
-    # Use the actual column names found
-    ftd_date_col = actual_ftd_col
-    kyc_date_col = actual_kyc_col
-    source_col = actual_source_col
-    country_col = actual_country_col
-    
-    # Debug: Show actual raw date values
-    print("🔍 RAW DATE DEBUGGING:")
-    print("📌 NOTE: Reading all CSV columns as strings to prevent pandas auto-parsing")
-    
-    # EMERGENCY: Show ALL columns and sample values
-    print("\n🚨 EMERGENCY DEBUG - ALL COLUMNS AND SAMPLE VALUES:")
-    for col in df.columns[:20]:  # Show first 20 columns
-        sample_vals = df[col].head(3).tolist()
-        print(f"  Column '{col}': {sample_vals}")
-    
-    print(f"\n🎯 Looking for FTD column: '{ftd_date_col}'")
-    print(f"🎯 Column exists in df: {ftd_date_col in df.columns}")
-    
-    if ftd_date_col in df.columns:
-        print(f"\nFirst 10 raw values from '{ftd_date_col}' column:")
-        for i in range(min(10, len(df))):
-            raw_value = df[ftd_date_col].iloc[i]
-            print(f"Row {i+1}: '{raw_value}' (type: {type(raw_value).__name__})")
-    else:
-        print(f"❌ ERROR: Column '{ftd_date_col}' NOT FOUND in DataFrame!")
-        print(f"Available columns: {list(df.columns)}")
-    
-    print(f"\n📋 Total columns: {len(df.columns)}")
-    print(f"📊 DataFrame shape: {df.shape}")
-    
-    # Parse FTD date column using EXPLICIT DD/MM/YYYY parser
-    sample_dates = df[ftd_date_col].head(20).tolist()
-    print(f"DEBUG: Sample raw FTD dates: {sample_dates[:10]}")
-    print(f"DEBUG: Data types: {df[ftd_date_col].dtype}")
-    
-    # Check for unique date formats in the data
-    unique_formats = df[ftd_date_col].astype(str).str.extract(r'(\d+)[/-](\d+)[/-](\d+)', expand=False).notna().all(axis=1).sum()
-    print(f"DEBUG: Dates matching DD/MM/YYYY or DD-MM-YYYY pattern: {unique_formats}")
-    
-    # Debug parse first few dates to see what's happening
-    print("DEBUG: Parsing first 5 dates with debug mode:")
-    for i, date_str in enumerate(sample_dates[:5]):
-        print(f"  Date {i+1}: '{date_str}' (type: {type(date_str).__name__}, repr: {repr(date_str)})")
-        parse_dd_mm_yyyy_date(date_str, debug=True)
-    
-    # Apply the explicit parser to all FTD dates
-    df[ftd_date_col] = df[ftd_date_col].apply(parse_dd_mm_yyyy_date)
-    
-    # Ensure the column is datetime type
-    df[ftd_date_col] = pd.to_datetime(df[ftd_date_col])
-    
-    # Show parsing success rate BEFORE filtering
-    valid_dates_before_filter = df[ftd_date_col].notna().sum()
-    placeholder_dates = len(df) - valid_dates_before_filter
-    print(f'📊 FTD Parsing Results:')
-    print(f'  - Valid FTD dates parsed: {valid_dates_before_filter}')
-    print(f'  - Placeholder/No FTD (1/1/1970): {placeholder_dates}')
-    print(f'  - Total records: {len(df)}')
-    
-    # Mark dates before 2023 or after reasonable future as invalid
-    min_valid_date = pd.Timestamp('2023-01-01')
-    max_valid_date = pd.Timestamp('2026-12-31')  # Allow up to end of 2026
-    
-    ftd_before_2023 = (df[ftd_date_col] < min_valid_date).sum()
-    ftd_future = (df[ftd_date_col] > max_valid_date).sum()
-    
-    df.loc[df[ftd_date_col] < min_valid_date, ftd_date_col] = pd.NaT
-    df.loc[df[ftd_date_col] > max_valid_date, ftd_date_col] = pd.NaT
-    
-    invalid_ftd_dates = df[ftd_date_col].isna().sum()
-    valid_dates_after_filter = df[ftd_date_col].notna().sum()
-    print(f'✅ Final: {valid_dates_after_filter} valid FTD dates after filtering ({ftd_before_2023} before 2023, {ftd_future} after 2026)')
-    
-    # Parse KYC date column using EXPLICIT DD/MM/YYYY parser
-    print(f"DEBUG: Sample raw KYC dates: {df[kyc_date_col].head(10).tolist()}")
-    
-    # Apply the explicit parser to all KYC dates
-    df[kyc_date_col] = df[kyc_date_col].apply(parse_dd_mm_yyyy_date)
-    
-    # Ensure the column is datetime type
-    df[kyc_date_col] = pd.to_datetime(df[kyc_date_col])
-    
-    # Show parsing success rate
-    valid_kyc_dates = df[kyc_date_col].notna().sum()
-    print(f'✅ Successfully parsed {valid_kyc_dates} out of {len(df)} KYC dates ({valid_kyc_dates/len(df)*100:.1f}%)')
-    
-    # Mark KYC dates before 2023 or too far in future as invalid too
-    kyc_before_2023 = (df[kyc_date_col] < min_valid_date).sum()
-    kyc_future = (df[kyc_date_col] > max_valid_date).sum()
-    
-    df.loc[df[kyc_date_col] < min_valid_date, kyc_date_col] = pd.NaT
-    df.loc[df[kyc_date_col] > max_valid_date, kyc_date_col] = pd.NaT
-    
-    invalid_kyc_dates = df[kyc_date_col].isna().sum()
-    
-    # Fill missing sources and countries
-    df[source_col] = df[source_col].fillna("(Unknown)").astype(str).str.strip()
-    df[country_col] = df[country_col].fillna("(Unknown)").astype(str).str.strip()
-    
-    # Create month columns for both dashboards
-    df["ftd_month"] = df[ftd_date_col].dt.to_period("M").dt.to_timestamp()
-    df["kyc_month"] = df[kyc_date_col].dt.to_period("M").dt.to_timestamp()
-    
-    # Store diagnostic info
-    df.attrs['original_count'] = original_count
-    df.attrs['invalid_ftd_dates'] = invalid_ftd_dates
-    df.attrs['invalid_kyc_dates'] = invalid_kyc_dates
-    df.attrs['ftd_before_2023'] = ftd_before_2023
-    df.attrs['kyc_before_2023'] = kyc_before_2023
-    df.attrs['ftd_future'] = ftd_future
-    df.attrs['kyc_future'] = kyc_future
-    df.attrs['final_count'] = len(df)
-    
-    # Store the actual column names found for later use
-    df.attrs['ftd_date_col'] = ftd_date_col
-    df.attrs['kyc_date_col'] = kyc_date_col
-    df.attrs['source_col'] = source_col
-    df.attrs['country_col'] = country_col
-    
-    return df
+def load_df(dataset_key, _files, backend_name="pandas"):
+    # Format and date-encoding detection, parsing and month columns are shared with ftd_dashboard_new.py
+    return load_dataset(_files, get_backend(backend_name))
 
-if uploaded is not None:
+# dataset_key identifies the loaded data; every per-dataset cache below is keyed on it instead of hashing df
+if selected_snapshot is not None:
     try:
-        df = load_df(uploaded)
+        if snapshot_range is None:
+            dataset_key = f"snapshot-{selected_snapshot}"
+            df = load_snapshot(selected_snapshot)
+            st.info(f"📚 Viewing saved snapshot {snapshot_labels[selected_snapshot]}")
+        else:
+            start, end = snapshot_range
+            dataset_key = f"snapshot-{selected_snapshot}-{'-'.join(snapshot_month_cols)}-{start:%Y%m}-{end:%Y%m}"
+            df = load_snapshot(selected_snapshot, snapshot_month_cols, start, end)
+            st.info(f"📚 Viewing saved snapshot {snapshot_labels[selected_snapshot]}, {start:%b %Y} - {end:%b %Y}")
+    except Exception as e:
+        st.error(str(e))
+        st.stop()
+elif uploaded:
+    try:
+        # Each uploaded file is hashed once per session; reruns reuse the digest from session state
+        dataset_key = upload_key(uploaded, st.session_state.setdefault("upload_digests", {}))
+        df = load_df(dataset_key, uploaded, backend.name)
+        
+        # Persist each new upload to the history database (once per set of files)
+        if st.session_state.get("saved_upload_key") != dataset_key:
+            try:
+                save_upload(df, ", ".join(f.name for f in uploaded))
+                st.session_state.saved_upload_key = dataset_key
+            except sqlite3.Error as e:
+                st.caption(f"⚠️ Upload could not be saved to history: {e}")
         
         # Only show debug info if there are issues or debug mode is enabled
         show_debug = False
@@ -643,8 +544,8 @@ if uploaded is not None:
         
         if show_debug or st.session_state.get('debug_mode', False):
             with st.expander("🔍 RAW CSV DEBUG INFO", expanded=False):
-                if hasattr(df, 'attrs') and 'debug_info' in df.attrs:
-                    st.code(df.attrs['debug_info'], language='text')
+                if hasattr(df, 'attrs') and 'diagnostics' in df.attrs:
+                    st.code(format_diagnostics(df.attrs['diagnostics']), language='text')
                 else:
                     st.error("Debug info not available")
                 
@@ -652,11 +553,19 @@ if uploaded is not None:
         st.error(str(e))
         st.stop()
 else:
-    # Fallback: try to load a local file named source.csv if present
-    try:
-        df = load_df("source.csv")
-        st.info("Using local 'source.csv' found in the same folder (since you didn't upload a file here).")
-    except Exception:
+    # Fallback: local exports - every file in FTD_DATA_DIR, or source.csv (.csv.gz / .csv.zst / .zip) next to the app.
+    # They are loaded and watched by a background thread, so a replaced file shows up without a restart
+    watcher = get_data_watcher(os.environ.get(DATA_DIR_ENV_VAR), backend.name)
+    snapshot = watcher.wait()
+    if watcher.error is not None:
+        st.caption(f"⚠️ Reloading local data failed ({watcher.error}); showing the last version that loaded.")
+    if snapshot is not None:
+        df = snapshot.df
+        dataset_key = snapshot.key
+        names = ", ".join(f"'{os.path.basename(path)}'" for path in snapshot.files)
+        st.info(f"Using local {names} found in the data folder (since you didn't upload a file here). "
+                f"Loaded {snapshot.loaded_at:%Y-%m-%d %H:%M:%S}; changes are picked up automatically.")
+    else:
         # Welcome message for new users
         st.markdown("## 👋 Welcome to the FTD & KYC Analytics Dashboard!")
         
@@ -682,6 +591,17 @@ else:
         st.info("💡 **Tip**: The dashboard automatically filters to 2025 data and selects all sources by default, so you can see your results immediately after upload!")
         st.stop()
 
+# Rows sharing a Record ID are normally collapsed at load; under the "flag" policy they are kept, and every count
+# below counts distinct clients (CLIENT_KEY) instead of rows
+duplicates = df.attrs.get('duplicates', {})
+distinct_col = CLIENT_KEY if duplicates.get('policy') == "flag" and duplicates.get('duplicate_ids') else None
+
+def client_counts(frame, by):
+    """Clients per group: rows, or distinct Record IDs when duplicate rows were kept"""
+    if distinct_col:
+        return frame.groupby(by, dropna=False)[distinct_col].nunique()
+    return frame.groupby(by, dropna=False).size()
+
 # Data Quality Check
 with st.expander("📊 Data Quality Report", expanded=False):
     # Get the actual column names from the dataframe attributes
@@ -737,6 +657,45 @@ with st.expander("📊 Data Quality Report", expanded=False):
         else:
             st.warning(f"⚠️ **{df.attrs.get(invalid_dates_key, 0)} records have invalid dates** in '{active_date_col}' column. These dates could not be parsed.")
     
+    # Per-file breakdown when several files/sheets were combined
+    file_stats = df.attrs.get('file_stats', [])
+    if len(file_stats) > 1:
+        st.markdown("#### Files")
+        st.dataframe(
+            pd.DataFrame(file_stats).convert_dtypes().rename(columns={
+                "file": "File / Sheet", "rows": "Rows", "status": "Status",
+                "no_ftd_placeholders": "No FTD (1/1/1970)", "blank_ftd": "Blank FTD", "blank_kyc": "Blank KYC",
+                "unknown_source": "Blank Source", "duplicate_ids": "Duplicate IDs in File",
+                "duplicates_removed": "Removed as Duplicates", "ftd_encoding": "FTD Date Format", "kyc_encoding": "KYC Date Format",
+            }),
+            hide_index=True,
+            width="stretch",
+        )
+    
+    if duplicates.get('duplicate_ids'):
+        policy_notes = {
+            "latest_ftd": f"kept the row with the latest FTD date and removed {duplicates['removed']:,} rows",
+            "first": f"kept the first row and removed {duplicates['removed']:,} rows",
+            "flag": "kept every row; counts use distinct Record IDs",
+        }
+        st.warning(f"⚠️ **{duplicates['duplicate_ids']:,} Record IDs appear more than once** "
+                   f"({duplicates['duplicate_rows']:,} extra rows): {policy_notes[duplicates['policy']]} "
+                   f"(set FTD_DUPLICATE_POLICY to change).")
+    
+    # Per-column profile computed once at load (blank/placeholder/unparseable/out-of-range values, duplicate IDs)
+    quality_report = df.attrs.get('quality_report', [])
+    if quality_report:
+        st.markdown("#### Column Profile")
+        st.dataframe(
+            pd.DataFrame(quality_report).drop(columns="kind").rename(columns={
+                "column": "Column", "rows": "Rows", "blank": "Blank", "placeholders": "Placeholders",
+                "format_mismatch": "Unparseable", "before_min": "Before 2023", "after_max": "After 2026",
+                "duplicates": "Duplicates", "valid": "Valid",
+            }),
+            hide_index=True,
+            width="stretch",
+        )
+    
     st.markdown("#### Data Quality Metrics")
     col1, col2, col3 = st.columns(3)
     
@@ -789,7 +748,7 @@ with st.expander("📊 Data Quality Report", expanded=False):
     # Show monthly breakdown for verification
     st.markdown(f"#### Monthly Record Count (All Sources - {dashboard_type})")
     if len(valid_df) > 0:
-        monthly_counts = valid_df.groupby(valid_df[active_month_col].dt.to_period('M'))['Record ID'].count().sort_index()
+        monthly_counts = client_counts(valid_df, valid_df[active_month_col].dt.to_period('M')).sort_index()
         monthly_df = pd.DataFrame({
             'Month': monthly_counts.index.strftime('%B %Y'),
             'All Sources': monthly_counts.values
@@ -883,6 +842,17 @@ with tour_container:
 
 # --- Sidebar filters ---
 # Get the actual column names from the dataframe
+# Source taxonomy rules (source_taxonomy.json, or FTD_TAXONOMY_PATH), compiled once
+try:
+    taxonomy = get_taxonomy()
+except (OSError, ValueError) as e:
+    st.error(f"❌ Could not load the source taxonomy rules: {e}")
+    st.stop()
+
+def categorize_source(source_name):
+    """Category of a source under the taxonomy rules"""
+    return taxonomy.classify(source_name)["category"]
+
 source_col = df.attrs.get('source_col', 'portal - source_marketing_campaign')
 country_col = df.attrs.get('country_col', 'portal - country')
 group_sources = False  # Initialize here so it's available outside sidebar
@@ -898,8 +868,10 @@ with st.sidebar:
     
     st.markdown("---")
     # Source selection
-    totals = df.groupby(source_col, dropna=False)["Record ID"].size().sort_values(ascending=False)
+    totals = client_counts(df, source_col).sort_values(ascending=False)
     all_sources = totals.index.tolist()
+    # Categories the taxonomy gives this dataset's sources (what "Group Sources by Type" shows)
+    source_categories = sorted(set(taxonomy.categorize(pd.Series(all_sources, dtype=object))))
     
     # Only show source selection for individual dashboards, not comparison
     if dashboard_type != "KYC & FTD Comparison":
@@ -956,7 +928,7 @@ with st.sidebar:
         # For comparison dashboard, select all sources by default
         if "selected_sources" not in st.session_state or dashboard_type == "KYC & FTD Comparison":
             st.session_state.selected_sources = all_sources.copy()
-        st.info("📊 Source selection disabled - showing all sources grouped by type (IB, Organic, Marketing)")
+        st.info(f"📊 Source selection disabled - showing all sources grouped by type ({', '.join(source_categories)})")
     
     selected_sources = st.session_state.selected_sources
     
@@ -966,7 +938,7 @@ with st.sidebar:
     st.subheader("🌍 Country Filter")
     
     # Get country totals for display
-    country_totals = df.groupby(country_col, dropna=False)["Record ID"].size().sort_values(ascending=False)
+    country_totals = client_counts(df, country_col).sort_values(ascending=False)
     all_countries = country_totals.index.tolist()
     
     # Only show country selection for individual dashboards, not comparison
@@ -1099,6 +1071,10 @@ with st.sidebar:
                 months_by_year[year] = []
             months_by_year[year].append(month)
         
+        # Records per month (distinct clients when duplicate rows were kept), counted once for every checkbox
+        month_counts = client_counts(valid_df_sidebar, month_col)
+        month_unit = "clients" if distinct_col else "records"
+        
         # Display checkboxes grouped by year
         for idx, year in enumerate(sorted(months_by_year.keys(), reverse=True)):  # Most recent year first
             # Add spacing between year groups (but not before the first one)
@@ -1110,11 +1086,10 @@ with st.sidebar:
                 is_selected = month in st.session_state.selected_months
                 month_label = month.strftime("%B")
                 
-                # Count of records in this month
-                month_count = len(valid_df_sidebar[valid_df_sidebar[month_col] == month])
+                month_count = int(month_counts.get(month, 0))
                 
                 new_state = st.checkbox(
-                    f"{month_label} ({month_count:,} records)",
+                    f"{month_label} ({month_count:,} {month_unit})",
                     value=is_selected,
                     key=f"month_{month.strftime('%Y%m')}"
                 )
@@ -1156,6 +1131,16 @@ with st.sidebar:
 
     chart_type = st.radio("Chart type", ["Line", "Stacked bars"], horizontal=True)
     
+    # Time granularity for the chart and table (comparison view is always monthly)
+    if dashboard_type != "KYC & FTD Comparison":
+        granularity = st.radio("Granularity", ["Monthly", "Weekly", "Daily"], horizontal=True,
+                               help="Weekly uses ISO weeks (starting Monday). The month selection above still limits the date range.")
+    else:
+        granularity = "Monthly"
+    granularity_code = {"Monthly": "M", "Weekly": "W", "Daily": "D"}[granularity]
+    period_label = {"M": "Month", "W": "Week", "D": "Day"}[granularity_code]
+    period_format = "%b %Y" if granularity_code == "M" else "%d %b %Y"
+    
     st.markdown("---")
     st.subheader("Display Options")
     
@@ -1173,15 +1158,43 @@ with st.sidebar:
     
     show_total = st.checkbox("Show Total (All Sources)", value=True, help="Display a line showing the total across all selected sources")
     
+    max_chart_series = st.number_input("Max series in chart", min_value=1, max_value=50, value=DEFAULT_MAX_SERIES,
+                                       help=f"Only the top N sources by total are drawn; the rest are combined into '{OTHER_LABEL}'. Tables and exports keep every source.")
+    
+    # Rolling / YTD chart values (monthly FTD/KYC views only)
+    chart_measures = {"Per month": "clients", "Rolling 3 months": "rolling_3m", "Rolling 6 months": "rolling_6m",
+                      "Rolling 12 months": "rolling_12m", "Year to date": "ytd"}
+    if dashboard_type != "KYC & FTD Comparison" and granularity_code == "M":
+        chart_measure_label = st.selectbox("Chart values", list(chart_measures), index=0,
+                                           help="Rolling sums, YTD and year-over-year use every month in the data, not only the selected ones")
+    else:
+        chart_measure_label = "Per month"
+    chart_measure = chart_measures[chart_measure_label]
+    
+    # Forecast overlay (monthly FTD/KYC views only)
+    if dashboard_type != "KYC & FTD Comparison" and granularity_code == "M":
+        show_forecast = st.checkbox("Show forecast", value=False,
+                                    help="Project every series in the chart forward with a linear trend (plus month-of-year seasonality once 2 years of months are selected), with a 95% band")
+        forecast_horizon = st.number_input("Forecast months", min_value=1, max_value=12, value=FORECAST_HORIZON) if show_forecast else FORECAST_HORIZON
+    else:
+        show_forecast = False
+        forecast_horizon = FORECAST_HORIZON
+    
+    # Anomaly highlighting (FTD/KYC views only)
+    if dashboard_type != "KYC & FTD Comparison":
+        highlight_anomalies = st.checkbox("Highlight anomalies", value=False, key="highlight_anomalies",
+                                          help=f"Flag {period_label.lower()}s where a series is unusually far from its own typical value (robust z-score ≥ {ANOMALY_THRESHOLD})")
+    else:
+        highlight_anomalies = False
+    
     # Source grouping option
     group_sources = st.checkbox("Group Sources by Type", value=False, 
-                                help="Group sources into IB, Organic (Unknown), and Marketing categories")
+                                help="Group sources into the categories of the source taxonomy rules")
     
     if group_sources:
-        st.caption("📊 **Grouping Logic:**")
-        st.caption("• **IB**: Sources containing 'IB' in the name")
-        st.caption("• **Organic**: Unknown sources")
-        st.caption("• **Marketing**: All other sources")
+        st.caption("📊 **Grouping Logic** (source taxonomy rules):")
+        for category, channels in taxonomy.rule_summary().items():
+            st.caption(f"• **{category}**: {', '.join(channels)}")
     
     # Country breakdown option
     show_by_country = st.checkbox("Show by Country", value=False,
@@ -1193,7 +1206,16 @@ with st.sidebar:
         if group_sources:
             st.warning("⚠️ Source grouping disabled when showing by country")
             group_sources = False
-    
+
+    # Sketch-based KPIs and ranking for very large exports (FTD/KYC views only)
+    if dashboard_type != "KYC & FTD Comparison":
+        approximate_mode = st.checkbox("Approximate mode", value=False,
+                                       help="Answer the overview KPIs and Top Performers from per-month/country sketches "
+                                            f"(HyperLogLog, ~{hll_standard_error():.1%} error; Space-Saving heavy hitters) "
+                                            "instead of re-counting records. Used when every source is selected.")
+    else:
+        approximate_mode = False
+
     # Debug mode toggle at the bottom
     st.markdown("---")
     st.session_state.debug_mode = st.checkbox("🔧 Debug Mode", 
@@ -1213,230 +1235,288 @@ else:  # KYC & FTD Comparison
     filter_month_col = None  # Will handle differently
     filter_date_col = None
 
-# Filter by selected months (not just range)
-if dashboard_type == "KYC & FTD Comparison":
-    # For comparison, filter both date columns
-    ftd_col = df.attrs.get('ftd_date_col', 'portal - ftd_time')
-    kyc_col = df.attrs.get('kyc_date_col', 'DATE_CREATED')
-    
-    # Create masks for both metrics
-    mask_time_ftd = df["ftd_month"].isin(selected_months) if selected_months else pd.Series(False, index=df.index)
-    mask_time_kyc = df["kyc_month"].isin(selected_months) if selected_months else pd.Series(False, index=df.index)
-    mask_valid_ftd = df[ftd_col].notna()
-    mask_valid_kyc = df[kyc_col].notna()
-    
-    # We'll use all sources for comparison (already set above)
-    mask_source = pd.Series(True, index=df.index)
-    mask_country = df[country_col].isin(selected_countries) if selected_countries else pd.Series(True, index=df.index)
-    
-    # Create two filtered dataframes
-    dff_ftd = df.loc[mask_time_ftd & mask_valid_ftd & mask_country].copy()
-    dff_kyc = df.loc[mask_time_kyc & mask_valid_kyc & mask_country].copy()
-    dff = None  # Will handle differently
-else:
-    # Regular dashboard filtering
-    if selected_months:
-        mask_time = df[filter_month_col].isin(selected_months)
-    else:
-        mask_time = pd.Series(False, index=df.index)  # No months selected = no data
+# Pre-aggregated daily/weekly/monthly counts per source and country, built once per dataset
+@st.cache_data(show_spinner=False)
+def load_rollups(_df, dataset_key, date_col, month_col, source_col, country_col, backend_name="pandas", distinct=None):
+    """Counts per (month, period, source, country) for every granularity"""
+    return build_rollups(_df, date_col, month_col, [source_col, country_col], get_backend(backend_name), distinct)
 
-    # Also filter out records with invalid dates for this dashboard
-    mask_valid_dates = df[filter_date_col].notna()
+# Category -> channel -> campaign counts, pre-aggregated from the rollup cube once per dataset and granularity
+@st.cache_data(show_spinner=False)
+def load_hierarchy(_df, dataset_key, date_col, month_col, source_col, country_col, granularity, backend_name="pandas", distinct=None, taxonomy_version=None):
+    """Counts per (month, period, hierarchy path, country) for every hierarchy level"""
+    rollup = load_rollups(_df, dataset_key, date_col, month_col, source_col, country_col, backend_name, distinct)[granularity]
+    return build_hierarchy(rollup, source_col, get_backend(backend_name), get_taxonomy(), [country_col])
 
-    mask_source = df[source_col].isin(selected_sources) if selected_sources else pd.Series(True, index=df.index)
-    mask_country = df[country_col].isin(selected_countries) if selected_countries else pd.Series(True, index=df.index)
-    dff = df.loc[mask_time & mask_valid_dates & mask_source & mask_country].copy()
+# Record positions sorted by (month, source|country) for the drill-down, built once per dataset
+@st.cache_resource(show_spinner=False)
+def load_record_index(_df, dataset_key, month_col, key_col):
+    """Index of the records behind every (month, key) cell"""
+    return RecordIndex(_df[month_col], _df[key_col])
 
-# Also get data for ALL sources in the selected months (for active sources calculation)
-if dashboard_type != "KYC & FTD Comparison":
-    dff_all_sources = df.loc[mask_time & mask_valid_dates].copy()
-else:
-    dff_all_sources = None  # Not needed for comparison
+# Distinct-count and heavy-hitter sketches per (month, country) for approximate mode, built once per dataset
+@st.cache_resource(show_spinner=False)
+def load_sketches(_df, dataset_key, month_col, source_col, country_col):
+    """SketchCube of distinct clients, distinct sources and top sources per (month, country)"""
+    return build_sketches(_df, month_col, source_col, country_col, CLIENT_KEY)
 
-# Function to categorize sources
-def categorize_source(source_name):
-    """Categorize source into IB, Organic, or Marketing"""
-    source_lower = source_name.lower()
-    if 'ib' in source_lower:
-        return '🏦 IB Sources'
-    elif source_lower in ['(unknown)', 'unknown']:
-        return '🌱 Organic'
-    else:
-        return '📢 Marketing'
+# Sketches answer the KPI row and Top Performers only when every source is selected (they are per month/country)
+use_sketches = approximate_mode and len(selected_sources) == len(all_sources)
+sketches = load_sketches(df, dataset_key, filter_month_col, source_col, country_col) if use_sketches else None
 
-# Initialize column reference for charts
-source_col_for_chart = source_col
+# Filtered and aggregated results of the last few filter states, kept per session (LRU): switching back to a
+# recent view is a dictionary lookup instead of re-filtering and re-aggregating the records
+FILTER_MEMO_SIZE = 16
 
-# Aggregate
-if dashboard_type == "KYC & FTD Comparison":
-    # Special aggregation for comparison dashboard
-    # Process FTD data
-    dff_ftd['source_category'] = dff_ftd[source_col].apply(categorize_source)
-    ftd_counts = (
-        dff_ftd.groupby(["ftd_month", "source_category"])["Record ID"].size().reset_index(name="ftd_clients")
-    )
-    ftd_counts.rename(columns={"ftd_month": "month"}, inplace=True)
-    
-    # Process KYC data
-    dff_kyc['source_category'] = dff_kyc[source_col].apply(categorize_source)
-    kyc_counts = (
-        dff_kyc.groupby(["kyc_month", "source_category"])["Record ID"].size().reset_index(name="kyc_clients")
-    )
-    kyc_counts.rename(columns={"kyc_month": "month"}, inplace=True)
-    
-    # Get all unique categories
-    all_categories = sorted(set(
-        list(ftd_counts['source_category'].unique()) + 
-        list(kyc_counts['source_category'].unique())
-    ))
-    
-    # Create full month-category combinations
-    months = sorted(selected_months) if selected_months else []
-    if len(months) > 0 and len(all_categories) > 0:
-        full = pd.MultiIndex.from_product([months, all_categories], names=["month", "source_category"]).to_frame(index=False)
-        
-        # Merge FTD and KYC data
-        comparison_data = full.merge(ftd_counts, on=["month", "source_category"], how="left")
-        comparison_data = comparison_data.merge(kyc_counts, on=["month", "source_category"], how="left")
-        comparison_data = comparison_data.fillna({"ftd_clients": 0, "kyc_clients": 0})
-        
-        # Calculate conversion rate
-        comparison_data['conversion_rate'] = (comparison_data['ftd_clients'] / comparison_data['kyc_clients'] * 100).where(
-            comparison_data['kyc_clients'] > 0, 0
-        )
+def memo_get(key):
+    """Memoized view for a filter state (None if not cached), marked as most recently used"""
+    memo = st.session_state.setdefault("filter_memo", OrderedDict())
+    view = memo.get(key)
+    if view is not None:
+        memo.move_to_end(key)
+    return view
+
+def memo_put(key, view):
+    """Store the view of a filter state, evicting the least recently used ones beyond FILTER_MEMO_SIZE"""
+    memo = st.session_state.setdefault("filter_memo", OrderedDict())
+    memo[key] = view
+    while len(memo) > FILTER_MEMO_SIZE:
+        memo.popitem(last=False)
+    return view
+
+# Canonical filter state: the selections as sets, so the order of checkbox clicks does not matter
+filter_state = (
+    dataset_key, dashboard_type, granularity_code, comparison_view,
+    frozenset(selected_months), frozenset(selected_sources), frozenset(selected_countries),
+    group_sources, show_by_country, distinct_col, taxonomy.version,
+)
+view = memo_get(filter_state)
+if view is None:
+    # Filter by selected months (not just range)
+    if dashboard_type == "KYC & FTD Comparison":
+        # For comparison, filter both date columns
+        ftd_col = df.attrs.get('ftd_date_col', 'portal - ftd_time')
+        kyc_col = df.attrs.get('kyc_date_col', 'DATE_CREATED')
+    
+        # Create masks for both metrics
+        mask_time_ftd = df["ftd_month"].isin(selected_months) if selected_months else pd.Series(False, index=df.index)
+        mask_time_kyc = df["kyc_month"].isin(selected_months) if selected_months else pd.Series(False, index=df.index)
+        mask_valid_ftd = df[ftd_col].notna()
+        mask_valid_kyc = df[kyc_col].notna()
+    
+        # We'll use all sources for comparison (already set above)
+        mask_source = pd.Series(True, index=df.index)
+        mask_country = df[country_col].isin(selected_countries) if selected_countries else pd.Series(True, index=df.index)
+    
+        # Create two filtered dataframes
+        dff_ftd = df.loc[mask_time_ftd & mask_valid_ftd & mask_country].copy()
+        dff_kyc = df.loc[mask_time_kyc & mask_valid_kyc & mask_country].copy()
     else:
-        comparison_data = pd.DataFrame(columns=["month", "source_category", "ftd_clients", "kyc_clients", "conversion_rate"])
+        # Regular dashboard filtering
+        if selected_months:
+            mask_time = df[filter_month_col].isin(selected_months)
+        else:
+            mask_time = pd.Series(False, index=df.index)  # No months selected = no data
+
+        # Also filter out records with invalid dates for this dashboard
+        mask_valid_dates = df[filter_date_col].notna()
+
+        mask_source = df[source_col].isin(selected_sources) if selected_sources else pd.Series(True, index=df.index)
+        mask_country = df[country_col].isin(selected_countries) if selected_countries else pd.Series(True, index=df.index)
+        mask_view = mask_time & mask_valid_dates & mask_source & mask_country
+        has_records = bool(mask_view.any())
+
+    # Initialize column reference for charts
+    source_col_for_chart = source_col
+
+    # Aggregate
+    if dashboard_type == "KYC & FTD Comparison":
+        # Special aggregation for comparison dashboard
+        # Process FTD data
+        dff_ftd['source_category'] = taxonomy.categorize(dff_ftd[source_col])
+        ftd_counts = backend.count_by(dff_ftd, ["ftd_month", "source_category"], name="ftd_clients", distinct=distinct_col)
+        ftd_counts.rename(columns={"ftd_month": "month"}, inplace=True)
+    
+        # Process KYC data
+        dff_kyc['source_category'] = taxonomy.categorize(dff_kyc[source_col])
+        kyc_counts = backend.count_by(dff_kyc, ["kyc_month", "source_category"], name="kyc_clients", distinct=distinct_col)
+        kyc_counts.rename(columns={"kyc_month": "month"}, inplace=True)
+    
+        # Get all unique categories
+        all_categories = sorted(set(
+            list(ftd_counts['source_category'].unique()) + 
+            list(kyc_counts['source_category'].unique())
+        ))
+    
+        # Create full month-category combinations
+        months = sorted(selected_months) if selected_months else []
+        if len(months) > 0 and len(all_categories) > 0:
+            # Merge FTD and KYC data onto the full month x category grid
+            comparison_data = backend.merge_counts(ftd_counts, kyc_counts, ["month", "source_category"])
+            comparison_data = backend.densify(
+                comparison_data,
+                {"month": months, "source_category": all_categories},
+                ["ftd_clients", "kyc_clients"],
+            )
+        
+            # Calculate conversion rate
+            comparison_data['conversion_rate'] = (comparison_data['ftd_clients'] / comparison_data['kyc_clients'] * 100).where(
+                comparison_data['kyc_clients'] > 0, 0
+            )
+        else:
+            comparison_data = pd.DataFrame(columns=["month", "source_category", "ftd_clients", "kyc_clients", "conversion_rate"])
+    
+        # Totals per category and overall, counted over the whole selection (distinct clients under the flag policy,
+        # so a client with flagged duplicate rows in several months is counted once)
+        comparison_totals = pd.DataFrame({
+            "kyc_clients": client_counts(dff_kyc, "source_category"),
+            "ftd_clients": client_counts(dff_ftd, "source_category"),
+        }).fillna(0).astype("int64").rename_axis("source_category")
+        comparison_overall = {
+            "kyc_clients": int(dff_kyc[distinct_col].nunique()) if distinct_col else len(dff_kyc),
+            "ftd_clients": int(dff_ftd[distinct_col].nunique()) if distinct_col else len(dff_ftd),
+        }
     
-    # Prepare for charting based on view mode
-    if comparison_view == "Conversion Rate %":
-        # Create conversion rate data for each category
-        conv_chart = comparison_data[['month', 'source_category', 'conversion_rate']].copy()
-        conv_chart.rename(columns={'conversion_rate': 'clients', 'month': 'ftd_month', 'source_category': source_col}, inplace=True)
-        counts = conv_chart
-        display_sources = sorted(counts[source_col].unique())
-    else:
-        # Original absolute numbers view - reshape to long format for multi-line chart
-        ftd_chart = comparison_data[['month', 'source_category', 'ftd_clients']].copy()
-        ftd_chart['metric'] = 'FTD'
-        ftd_chart.rename(columns={'ftd_clients': 'clients'}, inplace=True)
+        # Prepare for charting based on view mode
+        if comparison_view == "Conversion Rate %":
+            # Create conversion rate data for each category
+            conv_chart = comparison_data[['month', 'source_category', 'conversion_rate']].copy()
+            conv_chart.rename(columns={'conversion_rate': 'clients', 'month': 'ftd_month', 'source_category': source_col}, inplace=True)
+            counts = conv_chart
+            display_sources = sorted(counts[source_col].unique())
+        else:
+            # Original absolute numbers view - reshape to long format for multi-line chart
+            ftd_chart = comparison_data[['month', 'source_category', 'ftd_clients']].copy()
+            ftd_chart['metric'] = 'FTD'
+            ftd_chart.rename(columns={'ftd_clients': 'clients'}, inplace=True)
         
-        kyc_chart = comparison_data[['month', 'source_category', 'kyc_clients']].copy()
-        kyc_chart['metric'] = 'KYC'
-        kyc_chart.rename(columns={'kyc_clients': 'clients'}, inplace=True)
+            kyc_chart = comparison_data[['month', 'source_category', 'kyc_clients']].copy()
+            kyc_chart['metric'] = 'KYC'
+            kyc_chart.rename(columns={'kyc_clients': 'clients'}, inplace=True)
         
-        counts = pd.concat([ftd_chart, kyc_chart], ignore_index=True)
-        counts['source_metric'] = counts['source_category'] + ' - ' + counts['metric']
-        counts.rename(columns={'month': 'ftd_month', 'source_metric': source_col}, inplace=True)
+            counts = pd.concat([ftd_chart, kyc_chart], ignore_index=True)
+            counts['source_metric'] = counts['source_category'] + ' - ' + counts['metric']
+            counts.rename(columns={'month': 'ftd_month', 'source_metric': source_col}, inplace=True)
         
-        # Set display sources for the chart
-        display_sources = sorted(counts[source_col].unique())
+            # Set display sources for the chart
+            display_sources = sorted(counts[source_col].unique())
     
-    group_sources = False  # Don't use regular grouping logic
+        group_sources = False  # Don't use regular grouping logic
     
-elif len(dff) == 0:
-    # No data after filtering - create empty dataframe with expected structure
-    months = sorted(selected_months) if selected_months else []
-    if group_sources:
-        # Create empty dataframe for grouped sources
-        display_sources = []
+    elif not has_records:
+        # No data after filtering - create empty dataframe with expected structure
+        months = sorted(selected_months) if selected_months else []
+        periods = periods_in_months(months, granularity_code)
+        if group_sources:
+            # Create empty dataframe for grouped sources
+            display_sources = []
+        else:
+            display_sources = selected_sources
+    
+        # Create empty counts dataframe
+        counts = pd.DataFrame(columns=["ftd_month", source_col, "clients"])
+        if len(periods) > 0 and len(display_sources) > 0:
+            # Create structure with zero clients
+            full = pd.MultiIndex.from_product([periods, display_sources], names=["ftd_month", source_col]).to_frame(index=False)
+            full["clients"] = 0
+            counts = full
     else:
-        display_sources = selected_sources
-    
-    # Create empty counts dataframe
-    counts = pd.DataFrame(columns=["ftd_month", source_col, "clients"])
-    if len(months) > 0 and len(display_sources) > 0:
-        # Create structure with zero clients
-        full = pd.MultiIndex.from_product([months, display_sources], names=["ftd_month", source_col]).to_frame(index=False)
-        full["clients"] = 0
-        counts = full
-elif show_by_country:
-    # Group by country instead of source
-    counts = (
-        dff.groupby([filter_month_col, country_col])["Record ID"].size().reset_index(name="clients")
-    )
-    counts.rename(columns={filter_month_col: "month"}, inplace=True)
-    
-    # Get unique countries from selected countries
-    selected_display_countries = dff[country_col].unique().tolist()
-    
-    # Use only selected months, not a continuous range
-    months = sorted(selected_months) if selected_months else []
-    # Ensure all (month, country) combos exist
-    if len(months) > 0 and len(selected_display_countries) > 0:
-        full = (
-            pd.MultiIndex.from_product([months, selected_display_countries], names=["month", country_col])
-            .to_frame(index=False)
-        )
-        counts = (
-            full.merge(counts, on=["month", country_col], how="left")
-            .fillna({"clients": 0})
-        )
-    # Rename back for consistency
-    counts.rename(columns={"month": "ftd_month"}, inplace=True)
-    
-    # Update display_sources to be countries for display purposes
-    display_sources = selected_display_countries
-    # Update the column name reference for charts
-    source_col_for_chart = country_col
-elif group_sources:
-    # Add source category column
-    dff['source_category'] = dff[source_col].apply(categorize_source)
-    
-    # Group by category instead of individual source
-    counts = (
-        dff.groupby([filter_month_col, "source_category"])["Record ID"].size().reset_index(name="clients")
-    )
-    counts.rename(columns={"source_category": source_col, filter_month_col: "month"}, inplace=True)
-    
-    # Get unique categories from selected sources
-    selected_categories = dff['source_category'].unique().tolist()
-    
-    # Use only selected months, not a continuous range
-    months = sorted(selected_months) if selected_months else []
-    # Ensure all (month, category) combos exist
-    if len(months) > 0 and len(selected_categories) > 0:
-        full = (
-            pd.MultiIndex.from_product([months, selected_categories], names=["month", source_col])
-            .to_frame(index=False)
-        )
-        counts = (
-            full.merge(counts, on=["month", source_col], how="left")
-            .fillna({"clients": 0})
-        )
-    # Rename back for consistency
-    counts.rename(columns={"month": "ftd_month"}, inplace=True)
+        # Aggregate from the pre-computed (month, period, source, country) rollup instead of the raw records
+        rollup = load_rollups(df, dataset_key, filter_date_col, filter_month_col, source_col, country_col, backend.name, distinct_col)[granularity_code]
+        cube_mask = rollup["month"].isin(selected_months)
+        if selected_sources:
+            cube_mask &= rollup[source_col].isin(selected_sources)
+        if selected_countries:
+            cube_mask &= rollup[country_col].isin(selected_countries)
+        cube = rollup[cube_mask]
+    
+        # Use only selected months, not a continuous range
+        months = sorted(selected_months) if selected_months else []
+        periods = periods_in_months(months, granularity_code)
     
-    # Update selected_sources to be categories for display purposes
-    display_sources = selected_categories
-else:
-    # Original aggregation by individual source
-    counts = (
-        dff.groupby([filter_month_col, source_col])["Record ID"].size().reset_index(name="clients")
-    )
-    # Rename month column for consistency
-    counts.rename(columns={filter_month_col: "month"}, inplace=True)
-    
-    # Use only selected months, not a continuous range
-    months = sorted(selected_months) if selected_months else []
-    # Ensure all (month, source) combos exist for proper stacking/lines
-    if len(months) > 0 and len(selected_sources) > 0:
-        full = (
-            pd.MultiIndex.from_product([months, selected_sources], names=["month", source_col])
-            .to_frame(index=False)
-        )
-        counts = (
-            full.merge(counts, on=["month", source_col], how="left")
-            .fillna({"clients": 0})
-        )
-    # Rename back for consistency with rest of code
-    counts.rename(columns={"month": "ftd_month"}, inplace=True)
-    display_sources = selected_sources
+        if show_by_country:
+            # Group by country instead of source
+            counts = backend.sum_by(cube, ["period", country_col])
+        
+            # Get unique countries from selected countries
+            display_sources = cube[country_col].unique().tolist()
+            # Update the column name reference for charts
+            source_col_for_chart = country_col
+        elif group_sources:
+            # Group by category instead of individual source
+            cube = cube.assign(source_category=taxonomy.categorize(cube[source_col]))
+            counts = backend.sum_by(cube, ["period", "source_category"])
+            counts.rename(columns={"source_category": source_col}, inplace=True)
+        
+            # Update selected_sources to be categories for display purposes
+            display_sources = cube["source_category"].unique().tolist()
+        else:
+            # Original aggregation by individual source
+            counts = backend.sum_by(cube, ["period", source_col])
+            display_sources = selected_sources
+    
+        # Ensure all (period, source) combos exist for proper stacking/lines
+        if len(periods) > 0 and len(display_sources) > 0:
+            counts = backend.densify(counts, {"period": periods, source_col_for_chart: display_sources}, ["clients"])
+        # Rename for consistency with rest of code (chart x-axis column)
+        counts.rename(columns={"period": "ftd_month"}, inplace=True)
+
+    # Monthly counts of the displayed series over the whole history (every month, not only the selected ones),
+    # so rolling windows, YTD and year-over-year values do not depend on which months are ticked
+    history_counts = None
+    if dashboard_type != "KYC & FTD Comparison" and granularity_code == "M":
+        history = load_rollups(df, dataset_key, filter_date_col, filter_month_col, source_col, country_col, backend.name, distinct_col)["M"]
+        history_mask = pd.Series(True, index=history.index)
+        if selected_sources:
+            history_mask &= history[source_col].isin(selected_sources)
+        if selected_countries:
+            history_mask &= history[country_col].isin(selected_countries)
+        history = history[history_mask]
+        if show_by_country:
+            history_counts = backend.sum_by(history, ["period", country_col])
+        elif group_sources:
+            history = history.assign(source_category=taxonomy.categorize(history[source_col]))
+            history_counts = backend.sum_by(history, ["period", "source_category"]).rename(columns={"source_category": source_col})
+        else:
+            history_counts = backend.sum_by(history, ["period", source_col])
+        history_counts = history_counts.rename(columns={"period": "ftd_month"})
+
+    # Headline total: with duplicate rows kept, a client spanning several months or sources is counted once
+    if dashboard_type == "KYC & FTD Comparison":
+        total_clients = None
+    elif distinct_col:
+        total_clients = int(df.loc[mask_view, distinct_col].nunique())
+    else:
+        total_clients = int(counts["clients"].sum()) if len(counts) > 0 else 0
+
+    monthly_totals = counts.groupby("ftd_month")["clients"].sum().reset_index()
+    monthly_totals["mom_growth"] = monthly_totals["clients"].pct_change().replace([np.inf, -np.inf], np.nan) * 100
+    view = memo_put(filter_state, {
+        "months": months, "counts": counts, "monthly_totals": monthly_totals, "display_sources": list(display_sources),
+        "source_col_for_chart": source_col_for_chart, "group_sources": group_sources, "history_counts": history_counts,
+        "total_clients": total_clients,
+        "comparison_data": comparison_data if dashboard_type == "KYC & FTD Comparison" else None,
+        "comparison_totals": comparison_totals if dashboard_type == "KYC & FTD Comparison" else None,
+        "comparison_overall": comparison_overall if dashboard_type == "KYC & FTD Comparison" else None,
+    })
+
+months = view["months"]
+counts = view["counts"]
+monthly_totals = view["monthly_totals"]
+display_sources = view["display_sources"]
+source_col_for_chart = view["source_col_for_chart"]
+group_sources = view["group_sources"]
+history_counts = view["history_counts"]
+if dashboard_type == "KYC & FTD Comparison":
+    comparison_data = view["comparison_data"]
+    comparison_totals = view["comparison_totals"]
+    comparison_overall = view["comparison_overall"]
 
 # KPI row
 if dashboard_type == "KYC & FTD Comparison":
     # Special metrics for comparison dashboard
-    total_kyc = comparison_data['kyc_clients'].sum() if 'comparison_data' in locals() else 0
-    total_ftd = comparison_data['ftd_clients'].sum() if 'comparison_data' in locals() else 0
+    total_kyc = comparison_overall['kyc_clients']
+    total_ftd = comparison_overall['ftd_clients']
     overall_conversion = (total_ftd / total_kyc * 100) if total_kyc > 0 else 0
     span_months = len(months)
     
@@ -1447,12 +1527,12 @@ if dashboard_type == "KYC & FTD Comparison":
     c3.metric("Conversion Rate", f"{overall_conversion:.1f}%",
               help="Overall FTD/KYC conversion rate")
     c4.metric("Period", f"{span_months} months")
-    c5.metric("Categories", "3", help="IB, Organic, Marketing")
+    c5.metric("Categories", f"{len(source_categories)}", help=", ".join(source_categories))
     
     # Show conversion rates by category
     if 'comparison_data' in locals() and len(comparison_data) > 0:
         st.markdown("### Conversion Rates by Source Type")
-        category_totals = comparison_data.groupby('source_category')[['kyc_clients', 'ftd_clients']].sum()
+        category_totals = comparison_totals.copy()
         category_totals['conversion_rate'] = (category_totals['ftd_clients'] / category_totals['kyc_clients'] * 100).fillna(0)
         
         cols = st.columns(3)
@@ -1465,15 +1545,24 @@ if dashboard_type == "KYC & FTD Comparison":
                 )
 else:
     # Regular dashboard metrics
-    total_clients = safe_int_convert(counts["clients"].sum() if len(counts) > 0 else 0)
     span_months = len(months)
-    avg_monthly = total_clients / span_months if span_months > 0 else 0
+    if use_sketches:
+        # Merged sketches of the selected month x country cells instead of counting records
+        total_clients = sketches.distinct_clients(selected_months, selected_countries or None)
+        total_sources_with_data = len(all_sources)
+        active_sources_in_period = min(sketches.distinct_sources(selected_months), total_sources_with_data)
+    else:
+        total_clients = view["total_clients"]
 
-    # Calculate active sources (sources with at least 1 client in the timeframe)
-    # Get unique sources that have data in the filtered timeframe (across ALL sources, not just selected)
-    sources_with_clients_in_period = dff_all_sources.groupby(source_col)["Record ID"].size()
-    active_sources_in_period = len(sources_with_clients_in_period[sources_with_clients_in_period > 0])
-    total_sources_with_data = df[source_col].nunique()
+        # Calculate active sources (sources with at least 1 client in the timeframe)
+        # Get unique sources that have data in the filtered timeframe (across ALL sources, not just selected)
+        active_key = ("active_sources", dataset_key, filter_month_col, frozenset(selected_months))
+        active_sources_in_period = memo_get(active_key)
+        if active_sources_in_period is None:
+            in_period = df[filter_month_col].isin(selected_months) & df[filter_date_col].notna()
+            active_sources_in_period = memo_put(active_key, df.loc[in_period, source_col].nunique())
+        total_sources_with_data = df[source_col].nunique()
+    avg_monthly = total_clients / span_months if span_months > 0 else 0
     active_percentage = (active_sources_in_period / total_sources_with_data * 100) if total_sources_with_data > 0 else 0
 
     st.markdown("### Overview")
@@ -1486,9 +1575,14 @@ else:
               f"{active_percentage:.1f}% active",
               help="Sources with ≥1 client in selected timeframe (across ALL sources)")
     k4.metric("Selected" if not group_sources else "Categories", 
-              f"{len(display_sources)} / {len(all_sources) if not group_sources else 3}",
+              f"{len(display_sources)} / {len(all_sources) if not group_sources else len(source_categories)}",
               help="Sources currently selected for display")
     k5.metric("Period", f"{span_months} months")
+    if use_sketches:
+        st.caption(f"≈ Approximate mode: total clients and active sources are HyperLogLog estimates "
+                   f"(standard error ~{sketches.standard_error:.1%}).")
+    elif approximate_mode:
+        st.caption("Approximate mode applies when every source is selected; showing exact counts.")
 
 # Add info about what's being displayed
 if show_by_country:
@@ -1509,10 +1603,7 @@ elif len(selected_sources) < len(all_sources):
 if len(counts) > 0 and span_months > 1:
     st.markdown("### Performance Metrics")
     
-    # Calculate month-over-month growth
-    monthly_totals = counts.groupby("ftd_month")["clients"].sum().reset_index()
-    monthly_totals["mom_growth"] = monthly_totals["clients"].pct_change() * 100
-    
+    # Month-over-month growth (monthly_totals comes with the memoized view)
     # Calculate metrics safely
     latest_month = monthly_totals.iloc[-1]["clients"] if len(monthly_totals) > 0 else 0
     prev_month = monthly_totals.iloc[-2]["clients"] if len(monthly_totals) > 1 else 0
@@ -1530,25 +1621,25 @@ if len(counts) > 0 and span_months > 1:
     
     m1, m2, m3, m4 = st.columns(4)
     m1.metric(
-        "Latest Month", 
+        f"Latest {period_label}", 
         f"{safe_int_convert(latest_month)} clients",
         f"{mom_change:+.1f}%" if mom_change != 0 else "0%"
     )
     m2.metric(
-        "Best Month", 
+        f"Best {period_label}", 
         f"{safe_int_convert(best_month['clients'])} clients",
-        f"{best_month['ftd_month']:%b %Y}"
+        f"{best_month['ftd_month']:{period_format}}"
     )
     m3.metric(
-        "Worst Month", 
+        f"Worst {period_label}", 
         f"{safe_int_convert(worst_month['clients'])} clients",
-        f"{worst_month['ftd_month']:%b %Y}"
+        f"{worst_month['ftd_month']:{period_format}}"
     )
     avg_growth = monthly_totals['mom_growth'].mean() if len(monthly_totals) > 0 else 0
     m4.metric(
         "Avg Growth",
         f"{avg_growth:.1f}%" if not pd.isna(avg_growth) else "0.0%",
-        "month-over-month"
+        f"{period_label.lower()}-over-{period_label.lower()}"
     )
 
 # Chart
@@ -1556,8 +1647,13 @@ import altair as alt
 
 alt.data_transformers.disable_max_rows()
 
-# Prepare data for chart
+# Prepare data for chart - cap the number of series so the chart spec stays small
 chart_data = counts.copy()
+chart_sources = display_sources
+if dashboard_type != "KYC & FTD Comparison" and len(display_sources) > max_chart_series:
+    chart_data, chart_sources = fold_top_n(counts, source_col_for_chart, max_chart_series)
+    chart_sources = chart_sources + [OTHER_LABEL]
+    st.caption(f"📦 Chart shows the top {max_chart_series} of {len(display_sources)} series; the remaining {len(display_sources) - max_chart_series} are combined into '{OTHER_LABEL}'.")
 
 # Debug info
 if st.checkbox("Show debug info", value=False, key="debug_info"):
@@ -1588,16 +1684,14 @@ if dashboard_type == "KYC & FTD Comparison":
             '📢 Marketing - KYC': '#FF9800',       # Orange for Marketing KYC
             '📢 Marketing - FTD': '#E65100'        # Darker orange for Marketing FTD
         }
-    domain = display_sources
-    range_colors = [color_mapping.get(s, '#808080') for s in domain]
-    color_scale = alt.Scale(domain=domain, range=range_colors)
+    color_domain = display_sources
+    color_range = [color_mapping.get(s, '#808080') for s in color_domain]
 elif show_total and (len(display_sources) > 1 or group_sources or show_by_country):
     # Calculate monthly totals
-    monthly_totals = counts.groupby("ftd_month")["clients"].sum().reset_index()
-    monthly_totals[source_col_for_chart] = "📊 TOTAL"
+    total_series = monthly_totals[["ftd_month", "clients"]].assign(**{source_col_for_chart: "📊 TOTAL"})
     
-    # Combine with original data
-    chart_data = pd.concat([counts, monthly_totals], ignore_index=True)
+    # Combine with (possibly folded) chart data
+    chart_data = pd.concat([chart_data, total_series], ignore_index=True)
     
     # Adjust color scale
     if group_sources:
@@ -1608,15 +1702,12 @@ elif show_total and (len(display_sources) > 1 or group_sources or show_by_countr
             '📢 Marketing': '#FF9800',     # Orange for Marketing
             '📊 TOTAL': '#ff0000'          # Red for Total
         }
-        domain = display_sources + ["📊 TOTAL"]
-        range_colors = [color_mapping.get(s, '#808080') for s in domain]
-        color_scale = alt.Scale(domain=domain, range=range_colors)
+        color_domain = display_sources + ["📊 TOTAL"]
+        color_range = [color_mapping.get(s, '#808080') for s in color_domain]
     else:
         # Original color scale for individual sources
-        color_scale = alt.Scale(
-            domain=display_sources + ["📊 TOTAL"],
-            range=["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"][:len(display_sources)] + ["#ff0000"]
-        )
+        color_domain = chart_sources + ["📊 TOTAL"]
+        color_range = series_colors(chart_sources) + ["#ff0000"]
 else:
     if group_sources:
         # Use specific colors for grouped categories without total
@@ -1625,91 +1716,178 @@ else:
             '🌱 Organic': '#2196F3',      # Blue for Organic
             '📢 Marketing': '#FF9800'      # Orange for Marketing
         }
-        domain = display_sources
-        range_colors = [color_mapping.get(s, '#808080') for s in domain]
-        color_scale = alt.Scale(domain=domain, range=range_colors)
+        color_domain = display_sources
+        color_range = [color_mapping.get(s, '#808080') for s in color_domain]
     else:
         # Use default color scale for individual sources without total
         if len(display_sources) > 0:
-            color_scale = alt.Scale(
-                domain=display_sources,
-                range=["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"][:len(display_sources)]
-            )
+            color_domain = chart_sources
+            color_range = series_colors(chart_sources)
         else:
-            color_scale = None
-
-chart_base = alt.Chart(chart_data).encode(
-    x=alt.X("ftd_month:T", 
-            axis=alt.Axis(title="Month", format="%b %Y"),
-            scale=alt.Scale(padding=20)),
-    y=alt.Y("clients:Q", 
-            axis=alt.Axis(title="Conversion Rate (%)" if dashboard_type == "KYC & FTD Comparison" and comparison_view == "Conversion Rate %" else "Clients"), 
-            stack=None if chart_type == "Line" else "zero"),
-    color=alt.Color(f"{source_col_for_chart}:N", 
-                   legend=alt.Legend(title="Country" if show_by_country else "Source"),
-                   scale=color_scale),
-    tooltip=[
-        alt.Tooltip("ftd_month:T", title="Month", format="%B %Y"),
-        alt.Tooltip(f"{source_col_for_chart}:N", title="Country" if show_by_country else "Source"),
-        alt.Tooltip("clients:Q", 
-                   title="Conversion Rate" if dashboard_type == "KYC & FTD Comparison" and comparison_view == "Conversion Rate %" else "Clients", 
-                   format=".1f" if dashboard_type == "KYC & FTD Comparison" and comparison_view == "Conversion Rate %" else ",.0f")
-    ]
-)
+            color_domain = color_range = None
+
+# Rolling, YTD and year-over-year values from prefix sums over the full-history month x series matrix
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_window_metrics(history_counts, series_col, series, months):
+    """Rolling sums, YTD and same month last year of every series, for the given months"""
+    metrics = PrefixSums(history_counts, series_col, series=series, months=months).metrics()
+    return metrics[metrics["ftd_month"].isin(months) & metrics[series_col].isin(series)].reset_index(drop=True)
+
+if history_counts is not None and len(months) > 0 and len(display_sources) > 0:
+    window_metrics = load_window_metrics(history_counts, source_col_for_chart, list(display_sources), list(months))
+else:
+    window_metrics = pd.DataFrame()
+
+if chart_measure != "clients" and not chart_data.empty and not window_metrics.empty:
+    # Window sums add up across series, so folded "Other" and TOTAL values are sums of the series' own windows
+    measure = window_metrics[["ftd_month", source_col_for_chart, chart_measure]].rename(columns={chart_measure: "clients"})
+    measure[source_col_for_chart] = measure[source_col_for_chart].where(measure[source_col_for_chart].isin(chart_sources), OTHER_LABEL)
+    parts = [measure.groupby(["ftd_month", source_col_for_chart], as_index=False)["clients"].sum(min_count=1)]
+    if (chart_data[source_col_for_chart] == "📊 TOTAL").any():
+        parts.append(measure.groupby("ftd_month", as_index=False)["clients"].sum(min_count=1).assign(**{source_col_for_chart: "📊 TOTAL"}))
+    chart_data = pd.concat(parts, ignore_index=True).dropna(subset=["clients"])
+    st.caption(f"📐 Chart shows {chart_measure_label.lower()} per {'country' if show_by_country else 'source'}; forecast and anomaly markers apply to per-month values only.")
+
+# Anomaly scores for every period x source/country cell, one matrix pass per aggregation
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_anomalies(counts, series_col, exclude):
+    """Robust z-scores of the counts against each series' own history, leaving out the ``exclude`` periods"""
+    return anomaly_scores(counts, series_col, exclude=exclude)
+
+if highlight_anomalies and len(counts) > 0:
+    # Partial periods (data starting/ending mid-period, weeks clipped by the month selection) are not scored
+    data_dates = df[filter_date_col]
+    partial_periods = incomplete_periods(counts["ftd_month"].unique(), granularity_code, months, data_dates.min(), data_dates.max())
+    anomalies = load_anomalies(counts, source_col_for_chart, tuple(partial_periods))
+    if partial_periods:
+        st.caption(f"🚨 Incomplete {period_label.lower()}s are not checked for anomalies: "
+                   f"{', '.join(pd.DatetimeIndex(partial_periods).strftime(period_format))}.")
+else:
+    anomalies = None
 
-if chart_type == "Line":
-    # Create line with visible points for better hover experience
-    # Make TOTAL line thicker if present
-    if show_total and ("📊 TOTAL" in chart_data[source_col_for_chart].values):
-        line = chart_base.mark_line().encode(
-            strokeWidth=alt.condition(
-                alt.datum[source_col_for_chart] == "📊 TOTAL",
-                alt.value(4),  # Thicker line for total
-                alt.value(2)   # Normal line for sources
-            ),
-            opacity=alt.condition(
-                alt.datum[source_col_for_chart] == "📊 TOTAL",
-                alt.value(1),    # Full opacity for total
-                alt.value(0.7)   # Slightly transparent for sources
+# Forecast for every charted series, fitted in one batch per chart state
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_forecast(chart_data, series_col, horizon):
+    """Projected clients per series for the months after the chart"""
+    return forecast_series(chart_data, series_col, horizon)
+
+if show_forecast and chart_measure == "clients" and not chart_data.empty:
+    forecast = load_forecast(chart_data, source_col_for_chart, forecast_horizon)
+else:
+    forecast = None
+
+# Main chart spec, memoized on the aggregated data and view settings so unrelated reruns skip rebuilding it
+@st.cache_data(show_spinner=False, max_entries=32)
+def build_chart_spec(chart_data, series_col, color_domain, color_range, chart_type, show_total,
+                     y_title, value_title, value_format, legend_title, period_label, period_format, tooltip_format,
+                     forecast=None, anomalies=None):
+    """Vega-Lite spec (dict) for the monthly acquisition / comparison chart"""
+    color_scale = alt.Scale(domain=color_domain, range=color_range) if color_domain is not None else None
+    
+    chart_base = alt.Chart(chart_data).encode(
+        x=alt.X("ftd_month:T", 
+                axis=alt.Axis(title=period_label, format=period_format),
+                scale=alt.Scale(padding=20)),
+        y=alt.Y("clients:Q", 
+                axis=alt.Axis(title=y_title), 
+                stack=None if chart_type == "Line" else "zero"),
+        color=alt.Color(f"{series_col}:N", 
+                       legend=alt.Legend(title=legend_title),
+                       scale=color_scale),
+        tooltip=[
+            alt.Tooltip("ftd_month:T", title=period_label, format=tooltip_format),
+            alt.Tooltip(f"{series_col}:N", title=legend_title),
+            alt.Tooltip("clients:Q", title=value_title, format=value_format)
+        ]
+    )
+    
+    if chart_type == "Line":
+        # Create line with visible points for better hover experience
+        # Make TOTAL line thicker if present
+        if show_total and ("📊 TOTAL" in chart_data[series_col].values):
+            line = chart_base.mark_line().encode(
+                strokeWidth=alt.condition(
+                    alt.datum[series_col] == "📊 TOTAL",
+                    alt.value(4),  # Thicker line for total
+                    alt.value(2)   # Normal line for sources
+                ),
+                opacity=alt.condition(
+                    alt.datum[series_col] == "📊 TOTAL",
+                    alt.value(1),    # Full opacity for total
+                    alt.value(0.7)   # Slightly transparent for sources
+                )
             )
+            points = chart_base.mark_circle().encode(
+                size=alt.condition(
+                    alt.datum[series_col] == "📊 TOTAL",
+                    alt.value(70),   # Bigger points for total
+                    alt.value(40)    # Normal points for sources
+                ),
+                opacity=alt.value(1)
+            )
+        else:
+            line = chart_base.mark_line(strokeWidth=2, opacity=0.8)
+            points = chart_base.mark_circle(size=50, opacity=1)
+    
+        # Add hover selection for highlighting
+        hover = alt.selection_point(
+            fields=["ftd_month"], 
+            nearest=True, 
+            on="mouseover",
+            empty=False
         )
-        points = chart_base.mark_circle().encode(
-            size=alt.condition(
-                alt.datum[source_col_for_chart] == "📊 TOTAL",
-                alt.value(70),   # Bigger points for total
-                alt.value(40)    # Normal points for sources
-            ),
-            opacity=alt.value(1)
-        )
-    else:
-        line = chart_base.mark_line(strokeWidth=2, opacity=0.8)
-        points = chart_base.mark_circle(size=50, opacity=1)
-    
-    # Add hover selection for highlighting
-    hover = alt.selection_point(
-        fields=["ftd_month"], 
-        nearest=True, 
-        on="mouseover",
-        empty=False
-    )
     
-    # Create a vertical rule at hover position
-    rules = alt.Chart(chart_data).mark_rule(color="gray", strokeDash=[3, 3], opacity=0.5).encode(
-        x="ftd_month:T"
-    ).transform_filter(hover)
+        # Create a vertical rule at hover position
+        rules = alt.Chart(chart_data).mark_rule(color="gray", strokeDash=[3, 3], opacity=0.5).encode(
+            x="ftd_month:T"
+        ).transform_filter(hover)
     
-    # Update points to be larger when hovered
-    points = points.add_params(hover).encode(
-        size=alt.condition(hover, alt.value(100), alt.value(50))
-    )
+        # Update points to be larger when hovered
+        points = points.add_params(hover).encode(
+            size=alt.condition(hover, alt.value(100), alt.value(50))
+        )
     
-    chart = line + points + rules
-else:
-    # Add hover effect for bars
-    hover = alt.selection_point(on="mouseover", empty=False)
-    chart = chart_base.mark_bar(opacity=0.9).add_params(hover).encode(
-        opacity=alt.condition(hover, alt.value(1), alt.value(0.7))
-    )
+        chart = line + points + rules
+        
+        # Dashed forecast lines with their prediction bands
+        if forecast is not None and not forecast.empty:
+            forecast_base = alt.Chart(forecast).encode(
+                x="ftd_month:T",
+                color=alt.Color(f"{series_col}:N", legend=None, scale=color_scale),
+                tooltip=[
+                    alt.Tooltip("ftd_month:T", title=period_label, format=tooltip_format),
+                    alt.Tooltip(f"{series_col}:N", title=legend_title),
+                    alt.Tooltip("forecast:Q", title="Forecast", format=",.0f"),
+                    alt.Tooltip("lower:Q", title="Low", format=",.0f"),
+                    alt.Tooltip("upper:Q", title="High", format=",.0f"),
+                ],
+            )
+            band = forecast_base.mark_area(opacity=0.15).encode(y="lower:Q", y2="upper:Q")
+            forecast_line = forecast_base.mark_line(strokeDash=[6, 4], point=True).encode(y="forecast:Q")
+            chart = chart + band + forecast_line
+        
+        # Red rings around anomalous points
+        if anomalies is not None and not anomalies.empty:
+            rings = alt.Chart(anomalies).mark_point(size=220, filled=False, color="red", strokeWidth=2).encode(
+                x="ftd_month:T",
+                y="clients:Q",
+                tooltip=[
+                    alt.Tooltip("ftd_month:T", title=period_label, format=tooltip_format),
+                    alt.Tooltip(f"{series_col}:N", title=legend_title),
+                    alt.Tooltip("clients:Q", title=value_title, format=value_format),
+                    alt.Tooltip("median:Q", title="Typical", format=",.0f"),
+                    alt.Tooltip("score:Q", title="Anomaly score", format="+.1f"),
+                ],
+            )
+            chart = chart + rings
+    else:
+        # Add hover effect for bars
+        hover = alt.selection_point(on="mouseover", empty=False)
+        chart = chart_base.mark_bar(opacity=0.9).add_params(hover).encode(
+            opacity=alt.condition(hover, alt.value(1), alt.value(0.7))
+        )
+    
+    return chart.properties(height=380).interactive().to_dict()
 
 if dashboard_type == "KYC & FTD Comparison":
     if comparison_view == "Conversion Rate %":
@@ -1718,19 +1896,96 @@ if dashboard_type == "KYC & FTD Comparison":
         st.markdown("### KYC vs FTD Comparison by Source Type")
 else:
     if show_by_country:
-        st.markdown("### Monthly acquisition by country")
+        st.markdown(f"### {granularity} acquisition by country")
     elif group_sources:
-        st.markdown("### Monthly acquisition by source type")
+        st.markdown(f"### {granularity} acquisition by source type")
     else:
-        st.markdown("### Monthly acquisition by source")
+        st.markdown(f"### {granularity} acquisition by source")
 if not chart_data.empty:
-    st.altair_chart(chart.properties(height=380).interactive(), use_container_width=True)
+    is_conversion_rate = dashboard_type == "KYC & FTD Comparison" and comparison_view == "Conversion Rate %"
+    chart_spec = build_chart_spec(
+        chart_data, source_col_for_chart, color_domain, color_range, chart_type, show_total,
+        y_title="Conversion Rate (%)" if is_conversion_rate else "Clients" if chart_measure == "clients" else f"Clients ({chart_measure_label.lower()})",
+        value_title="Conversion Rate" if is_conversion_rate else "Clients",
+        value_format=".1f" if is_conversion_rate else ",.0f",
+        legend_title="Country" if show_by_country else "Source",
+        period_label=period_label,
+        period_format=period_format,
+        tooltip_format="%B %Y" if granularity_code == "M" else "%a %d %B %Y",
+        forecast=forecast if chart_type == "Line" else None,
+        anomalies=(
+            anomalies[anomalies["is_anomaly"] & anomalies[source_col_for_chart].isin(chart_sources)]
+            if anomalies is not None and chart_type == "Line" and chart_measure == "clients" else None
+        ),
+    )
+    st.vega_lite_chart(spec=chart_spec, use_container_width=True)
+    
+    if forecast is not None:
+        if forecast.empty:
+            st.caption("📈 Not enough selected months to fit a forecast.")
+        else:
+            if chart_type != "Line":
+                st.caption("📈 Forecast lines are drawn on the line chart; projections are listed below.")
+            with st.expander(f"📈 Forecast: next {forecast_horizon} months", expanded=False):
+                forecast_table = forecast.assign(
+                    projection=forecast.apply(lambda r: f"{r['forecast']:,.0f} ({r['lower']:,.0f}–{r['upper']:,.0f})", axis=1)
+                ).pivot(index=source_col_for_chart, columns="ftd_month", values="projection")
+                forecast_table.columns = forecast_table.columns.strftime("%b %Y")
+                st.caption("Point forecast with 95% range. Series folded into Other are forecast together.")
+                st.dataframe(forecast_table, width="stretch")
 else:
     st.info("No data to display. Please select at least one source from the sidebar.")
 
+# Time-to-convert cohorts (comparison dashboard only)
+@st.cache_data(show_spinner=False)
+def load_cohorts(_df, dataset_key, source_col, taxonomy_version=None, distinct=None):
+    """KYC -> FTD cohorts by KYC month and source category, computed once per dataset"""
+    categories = get_taxonomy().categorize(_df[source_col])
+    return build_cohorts(_df, categories, distinct=distinct)
+
+if dashboard_type == "KYC & FTD Comparison":
+    st.markdown("### ⏱️ Time to Convert (KYC → FTD Cohorts)")
+    st.caption("Each KYC month is a cohort: the chart shows the share of its clients who made their first deposit within N days of KYC. "
+               "Unlike the same-month rate above, late deposits are credited to the month the client completed KYC. "
+               "All countries included; recent cohorts have not had the full window to convert yet.")
+    
+    cohorts = load_cohorts(df, dataset_key, source_col, taxonomy.version, distinct_col)
+    cohort_months = sorted(selected_months) if selected_months else []
+    curves = cohort_curves(cohorts, cohort_months)
+    
+    if curves.empty:
+        st.info("No KYC cohorts in the selected months.")
+    else:
+        cohort_colors = {'🏦 IB Sources': '#4CAF50', '🌱 Organic': '#2196F3', '📢 Marketing': '#FF9800'}
+        cohort_domain = sorted(curves["category"].unique())
+        cohort_chart = alt.Chart(curves).mark_line(strokeWidth=2).encode(
+            x=alt.X("days:Q", axis=alt.Axis(title="Days since KYC")),
+            y=alt.Y("conversion_rate:Q", axis=alt.Axis(title="Converted to FTD (%)")),
+            color=alt.Color("category:N", legend=alt.Legend(title="Source Type"),
+                            scale=alt.Scale(domain=cohort_domain, range=[cohort_colors.get(c, '#808080') for c in cohort_domain])),
+            tooltip=[
+                alt.Tooltip("category:N", title="Source Type"),
+                alt.Tooltip("days:Q", title="Days"),
+                alt.Tooltip("conversion_rate:Q", title="Converted %", format=".1f")
+            ]
+        )
+        st.altair_chart(cohort_chart.properties(height=320).interactive(), use_container_width=True)
+        
+        cohort_summary = cohorts["summary"]
+        cohort_summary = cohort_summary[cohort_summary.index.get_level_values("kyc_month").isin(cohort_months)].reset_index()
+        cohort_table = pd.DataFrame({
+            "KYC Month": cohort_summary["kyc_month"].dt.strftime("%b %Y"),
+            "Source Type": cohort_summary["category"],
+            "KYC Clients": cohort_summary["kyc_clients"],
+            "FTD Clients": cohort_summary["ftd_clients"],
+            **{f"≤{w}d %": cohort_summary[f"conv_{w}d"].round(1) for w in COHORT_WINDOWS},
+            "Median Days": cohort_summary["median_days"].round(0),
+        })
+        st.dataframe(cohort_table, hide_index=True, width="stretch")
+
 # Pivot table (not for comparison dashboard)
 if dashboard_type != "KYC & FTD Comparison":
-    st.markdown("### Table: counts by month")
+    st.markdown(f"### Table: counts by {period_label.lower()}")
     if group_sources:
         st.caption("📊 Data grouped by category (IB / Organic / Marketing)")
     elif show_by_country:
@@ -1745,14 +2000,158 @@ if dashboard_type != "KYC & FTD Comparison":
         
         # Format the index to show month names (only if index is datetime)
         if len(pivot) > 0 and hasattr(pivot.index, 'strftime'):
-            pivot.index = pivot.index.strftime("%b %Y")
+            pivot.index = pivot.index.strftime(period_format)
 
-        st.dataframe(pivot, width="stretch")
+        # Only one page of columns is sent to the browser (columns ordered by total)
+        table_col1, table_col2, table_col3 = st.columns([1, 1, 1])
+        with table_col1:
+            pivot_page_size = st.number_input("Columns per page", min_value=5, max_value=200, value=DEFAULT_PIVOT_COLUMNS, step=5, key="pivot_page_size")
+        n_pivot_pages = max(1, -(-len(display_sources) // pivot_page_size))
+        with table_col2:
+            pivot_page_number = st.number_input(f"Page (of {n_pivot_pages})", min_value=1, max_value=n_pivot_pages, value=1, key="pivot_page")
+        with table_col3:
+            transpose_pivot = st.checkbox("Transpose (sources as rows)", value=False, key="pivot_transpose")
+        
+        pivot_view, _ = pivot_page(counts, source_col_for_chart, page=pivot_page_number - 1, page_size=pivot_page_size)
+        if hasattr(pivot_view.index, 'strftime'):
+            pivot_view.index = pivot_view.index.strftime(period_format)
+        if n_pivot_pages > 1:
+            first_col = (pivot_page_number - 1) * pivot_page_size + 1
+            last_col = min(pivot_page_number * pivot_page_size, len(display_sources))
+            st.caption(f"Showing columns {first_col}–{last_col} of {len(display_sources)}, ordered by total. Exports include every column.")
+        
+        # Shade anomalous cells (the TOTAL column is not scored)
+        if anomalies is not None and anomalies["is_anomaly"].any():
+            flags = anomalies.pivot(index="ftd_month", columns=source_col_for_chart, values="is_anomaly")
+            flags.index = flags.index.strftime(period_format)
+            flags = flags.reindex(index=pivot_view.index, columns=pivot_view.columns, fill_value=False).astype(bool)
+            if transpose_pivot:
+                pivot_view, flags = pivot_view.T, flags.T
+            cell_styles = pd.DataFrame(np.where(flags, "background-color: rgba(255, 0, 0, 0.25)", ""), index=flags.index, columns=flags.columns)
+            st.dataframe(pivot_view.style.apply(lambda _: cell_styles, axis=None), width="stretch")
+            st.caption(f"🚨 Shaded cells are anomalies (robust z-score ≥ {ANOMALY_THRESHOLD} against the series' own history).")
+        else:
+            st.dataframe(pivot_view.T if transpose_pivot else pivot_view, width="stretch")
     else:
         # Create empty pivot for export functionality
         pivot = pd.DataFrame()
         st.info("No data available to display in the table. Please check your filters and data quality.")
 
+    # Rolling windows, YTD and year-over-year per series as of the latest selected month
+    if not window_metrics.empty and len(counts) > 0:
+        latest = window_metrics[window_metrics["ftd_month"] == window_metrics["ftd_month"].max()]
+        st.markdown(f"#### Rolling windows & YTD (as of {latest['ftd_month'].max():%b %Y})")
+        st.caption("Windows count calendar months over the full history, whichever months are selected. — means not enough history.")
+        window_table = pd.DataFrame({
+            "Month": latest["clients"].to_numpy(),
+            "Last 3M": latest["rolling_3m"].to_numpy(),
+            "Last 6M": latest["rolling_6m"].to_numpy(),
+            "Last 12M": latest["rolling_12m"].to_numpy(),
+            "YTD": latest["ytd"].to_numpy(),
+            "Same month last year": latest["last_year"].to_numpy(),
+            "YoY %": latest["yoy_pct"].round(1).to_numpy(),
+        }, index=pd.Index(latest[source_col_for_chart].to_numpy(), name="Country" if show_by_country else "Source"))
+        st.dataframe(window_table.sort_values("YTD", ascending=False), width="stretch")
+
+    # Drill-down: the individual records behind one month x source/country cell
+    if len(counts) > 0 and len(months) > 0:
+        with st.expander("🔎 Drill-down: records behind a cell", expanded=False):
+            drill_label = "Country" if show_by_country else "Category" if group_sources else "Source"
+            drill_col1, drill_col2, drill_col3 = st.columns([1, 2, 1])
+            with drill_col1:
+                drill_month = st.selectbox("Month", months[::-1], format_func=lambda m: m.strftime("%b %Y"), key="drill_month")
+            with drill_col2:
+                drill_key = st.selectbox(drill_label, sorted(display_sources), key="drill_key")
+            with drill_col3:
+                drill_page_size = st.selectbox("Rows per page", [25, 50, 100, 250], index=1, key="drill_page_size")
+
+            # Only the cell's slice of the index is touched; the other filter is applied to that slice
+            if show_by_country:
+                record_index = load_record_index(df, dataset_key, filter_month_col, country_col)
+                drill_positions = record_index.positions(drill_month, [drill_key])
+                drill_records = df.iloc[drill_positions]
+                if selected_sources:
+                    drill_records = drill_records[drill_records[source_col].isin(selected_sources)]
+            else:
+                record_index = load_record_index(df, dataset_key, filter_month_col, source_col)
+                if group_sources:
+                    drill_keys = [s for s in (selected_sources or record_index.keys) if categorize_source(s) == drill_key]
+                else:
+                    drill_keys = [drill_key]
+                drill_positions = record_index.positions(drill_month, drill_keys)
+                drill_records = df.iloc[drill_positions]
+                if selected_countries:
+                    drill_records = drill_records[drill_records[country_col].isin(selected_countries)]
+
+            # Internal columns (month keys, client keys, the duplicate flag) are not part of the records
+            drill_records = drill_records.drop(columns=["ftd_month", "kyc_month", CLIENT_KEY, DUPLICATE_FLAG], errors="ignore")
+            n_drill_pages = max(1, -(-len(drill_records) // drill_page_size))
+            drill_page = st.number_input(f"Page (of {n_drill_pages})", min_value=1, max_value=n_drill_pages, value=1, key="drill_page")
+            start = (drill_page - 1) * drill_page_size
+            st.caption(
+                f"{len(drill_records):,} records for {drill_key} in {drill_month:%B %Y}"
+                + (f" (whole month; the table is by {period_label.lower()})" if granularity_code != "M" else "")
+            )
+            st.dataframe(
+                drill_records.iloc[start:start + drill_page_size],
+                hide_index=True,
+                width="stretch",
+            )
+            st.download_button(
+                label="📥 Download these records (CSV)",
+                data=drill_records.to_csv(index=False),
+                file_name=f"records_{drill_key}_{drill_month:%Y_%m}.csv",
+                mime="text/csv",
+                key="drill_download",
+            )
+
+    # Hierarchical view: each level is a lookup into the pre-aggregated hierarchy tables
+    if not show_by_country and len(months) > 0:
+        with st.expander("🌳 Source hierarchy: category → channel → campaign", expanded=False):
+            hierarchy = load_hierarchy(df, dataset_key, filter_date_col, filter_month_col, source_col, country_col, granularity_code, backend.name, distinct_col, taxonomy.version)
+            h_col1, h_col2 = st.columns(2)
+            with h_col1:
+                h_category = st.selectbox("Category", ["All"] + sorted(hierarchy["category"]["category"].unique()), key="hierarchy_category")
+            channel_table = hierarchy["channel"]
+            h_channels = sorted(channel_table.loc[channel_table["category"] == h_category, "channel"].unique())
+            with h_col2:
+                h_channel = st.selectbox("Channel", ["All"] + h_channels, key="hierarchy_channel", disabled=h_category == "All")
+            
+            if h_category == "All":
+                h_level = "category"
+                level_counts = hierarchy["category"]
+            elif h_channel not in h_channels:
+                h_level = "channel"
+                level_counts = channel_table[channel_table["category"] == h_category]
+            else:
+                h_level = "campaign"
+                campaign_table = hierarchy["campaign"]
+                level_counts = campaign_table[(campaign_table["category"] == h_category) & (campaign_table["channel"] == h_channel)]
+            
+            h_mask = level_counts["month"].isin(months)
+            if selected_countries:
+                h_mask &= level_counts[country_col].isin(selected_countries)
+            level_counts = backend.sum_by(level_counts[h_mask], ["period", h_level])
+            
+            breadcrumb = ["All sources"] + ([h_category] if h_level != "category" else []) + ([h_channel] if h_level == "campaign" else [])
+            st.caption(" → ".join(breadcrumb) + ". Uses the selected months and countries; the source selection does not apply here.")
+            if level_counts.empty:
+                st.info("No clients at this level for the selected months and countries.")
+            else:
+                level_totals = level_counts.groupby(h_level)["clients"].sum().sort_values(ascending=False)
+                level_table = pd.DataFrame({
+                    "Clients": level_totals.astype(int),
+                    "Share %": (level_totals / level_totals.sum() * 100).round(1),
+                })
+                level_table.index.name = h_level.capitalize()
+                level_pivot = (
+                    level_counts.pivot_table(index=h_level, columns="period", values="clients", fill_value=0, aggfunc="sum")
+                    .reindex(level_totals.index)
+                    .sort_index(axis=1)
+                )
+                level_pivot.columns = level_pivot.columns.strftime(period_format)
+                st.dataframe(level_table.join(level_pivot), width="stretch")
+
     # Source Performance Ranking
     if len(display_sources) > 0:
         if show_by_country:
@@ -1765,60 +2164,94 @@ if dashboard_type != "KYC & FTD Comparison":
     elif show_by_country:
         st.info("🌍 Showing performance for countries")
     
-    # Calculate source statistics
-    source_stats = []
-    for source in display_sources:
-        source_data = counts[counts[source_col_for_chart] == source]
-        total = source_data["clients"].sum()
-        avg = source_data["clients"].mean()
-        max_val = source_data["clients"].max()
-        min_val = source_data["clients"].min()
-        
-        # Debug info
-        print(f"DEBUG: source={source}, max_val={max_val} (type: {type(max_val)}), min_val={min_val} (type: {type(min_val)})")
-        
-        # Calculate trend (simple comparison of first half vs second half)
-        if len(source_data) > 2:
-            values = source_data["clients"].values
-            mid = len(values) // 2
-            first_half_avg = np.mean(values[:mid])
-            second_half_avg = np.mean(values[mid:])
+    if use_sketches and not (group_sources or show_by_country):
+        # Top sources from the merged heavy-hitter sketches instead of ranking every source
+        heavy_hitters = sketches.top_sources(selected_months, selected_countries or None)
+        top_5 = heavy_hitters.top(5)
+        st.caption("🏆 **Top Performers** (approximate)")
+        st.dataframe(pd.DataFrame({
+            "Source": top_5.index,
+            "Total Clients": top_5["count"].to_numpy(),
+            "At Least": top_5["guaranteed"].to_numpy(),
+        }), hide_index=True, width="stretch")
+        st.caption(f"Space-Saving sketch: each true total lies between 'At Least' and 'Total Clients'; any source not "
+                   f"listed has at most {heavy_hitters.floor:,} clients. Bottom performers need exact mode.")
+    else:
+        # Calculate source statistics
+        source_stats = []
+        for source in display_sources:
+            source_data = counts[counts[source_col_for_chart] == source]
+            total = source_data["clients"].sum()
+            avg = source_data["clients"].mean()
+            max_val = source_data["clients"].max()
+            min_val = source_data["clients"].min()
+        
+            logger.debug("Ranking source=%s max=%r min=%r", source, max_val, min_val)
+        
+            # Calculate trend (simple comparison of first half vs second half)
+            if len(source_data) > 2:
+                values = source_data["clients"].values
+                mid = len(values) // 2
+                first_half_avg = np.mean(values[:mid])
+                second_half_avg = np.mean(values[mid:])
             
-            # Compare averages to determine trend
-            change_percent = ((second_half_avg - first_half_avg) / first_half_avg * 100) if first_half_avg > 0 else 0
-            trend = "📈" if change_percent > 10 else "📉" if change_percent < -10 else "➡️"
-        else:
-            trend = "➡️"
+                # Compare averages to determine trend
+                change_percent = ((second_half_avg - first_half_avg) / first_half_avg * 100) if first_half_avg > 0 else 0
+                trend = "📈" if change_percent > 10 else "📉" if change_percent < -10 else "➡️"
+            else:
+                trend = "➡️"
         
-        if show_by_country:
-            label = "Country"
-        elif group_sources:
-            label = "Category"
-        else:
-            label = "Source"
-        source_stats.append({
-            label: source,
-            "Total Clients": safe_int_convert(total),
-            "Avg/Month": f"{avg:.1f}" if not pd.isna(avg) else "0.0",
-            "Best Month": safe_int_convert(max_val),
-            "Worst Month": safe_int_convert(min_val),
-            "Trend": trend
-        })
+            if show_by_country:
+                label = "Country"
+            elif group_sources:
+                label = "Category"
+            else:
+                label = "Source"
+            source_stats.append({
+                label: source,
+                "Total Clients": safe_int_convert(total),
+                f"Avg/{period_label}": f"{avg:.1f}" if not pd.isna(avg) else "0.0",
+                f"Best {period_label}": safe_int_convert(max_val),
+                f"Worst {period_label}": safe_int_convert(min_val),
+                "Trend": trend
+            })
     
-    source_df = pd.DataFrame(source_stats).sort_values("Total Clients", ascending=False)
+        source_df = pd.DataFrame(source_stats).sort_values("Total Clients", ascending=False)
     
-    col1, col2 = st.columns(2)
+        col1, col2 = st.columns(2)
     
-    with col1:
-        st.caption("🏆 **Top Performers**")
-        top_5 = source_df.head(5)
-        st.dataframe(top_5, hide_index=True, width="stretch")
+        with col1:
+            st.caption("🏆 **Top Performers**")
+            top_5 = source_df.head(5)
+            st.dataframe(top_5, hide_index=True, width="stretch")
     
-    with col2:
-        if len(source_df) > 5:
-            st.caption("⚠️ **Bottom Performers**")
-            bottom_5 = source_df.tail(5).sort_values("Total Clients", ascending=True)
-            st.dataframe(bottom_5, hide_index=True, width="stretch")
+        with col2:
+            if len(source_df) > 5:
+                st.caption("⚠️ **Bottom Performers**")
+                bottom_5 = source_df.tail(5).sort_values("Total Clients", ascending=True)
+                st.dataframe(bottom_5, hide_index=True, width="stretch")
+
+    # Most anomalous sources/countries, ranked by their most extreme period
+    if anomalies is not None:
+        st.markdown("### 🚨 Anomalies")
+        anomaly_list = top_anomalies(anomalies, source_col_for_chart)
+        if anomaly_list.empty:
+            st.caption(f"No {period_label.lower()} stands out from its series' own history.")
+        else:
+            label = "Country" if show_by_country else "Category" if group_sources else "Source"
+            st.caption("Spikes (score > 0) can mean fraud or duplicate tracking; drops (score < 0) can mean broken tracking.")
+            st.dataframe(
+                pd.DataFrame({
+                    label: anomaly_list[source_col_for_chart],
+                    f"Worst {period_label}": anomaly_list["ftd_month"].dt.strftime(period_format),
+                    "Clients": anomaly_list["clients"].astype(int),
+                    "Typical": anomaly_list["median"].round(1),
+                    "Score": anomaly_list["score"].round(1),
+                    f"Flagged {period_label}s": anomaly_list["flagged_periods"],
+                }),
+                hide_index=True,
+                width="stretch",
+            )
 
 # Download section with multiple formats
 st.markdown("### Export Data")
@@ -1931,6 +2364,7 @@ else:
                     "sources_selected": len(selected_sources)
                 },
                 "monthly_data": pivot.reset_index().to_dict(orient="records"),
+                "rolling_data": window_metrics.replace({np.nan: None}).to_dict(orient="records") if not window_metrics.empty else [],
                 "source_rankings": source_df.to_dict(orient="records") if len(display_sources) > 0 else []
             }
             json_str = json.dumps(json_data, indent=2, default=str)
@@ -1957,12 +2391,9 @@ with st.expander("ℹ️ Quick Reference", expanded=False):
         """)
     
     with col2:
-        st.markdown("""
-        **📊 Source Categories**
-        - IB: Contains "IB" in name
-        - Organic: Unknown/empty
-        - Marketing: All others
-        """)
+        st.markdown("**📊 Source Categories**\n" + "\n".join(
+            f"- {category}: {', '.join(channels)}" for category, channels in taxonomy.rule_summary().items()
+        ))
     
     with col3:
         st.markdown("""
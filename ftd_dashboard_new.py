@@ -5,14 +5,13 @@ Properly handles Excel serial number 25569 as NULL placeholder
 """
 
 import streamlit as st
-import pandas as pd
-import numpy as np
 import altair as alt
 from datetime import datetime
-import io
+from ftd_ingest import load_dataset, upload_key, configure_logging, UPLOAD_TYPES
 
 # Page config
 st.set_page_config(page_title="FTD Acquisition Dashboard", layout="wide")
+configure_logging()
 
 # Password protection
 def check_password():
@@ -35,118 +34,35 @@ st.title("FTD Acquisition Dashboard")
 st.caption("Fixed Excel serial number handling - Serial 25569 (1970-01-01) = NULL placeholder")
 
 # File uploader
-uploaded_file = st.file_uploader("Upload Excel file", type=['xlsx'])
-
-def convert_excel_serial_to_date(serial_value):
-    """
-    Convert Excel serial number to proper date
-    CRITICAL: 25569 = 1970-01-01 = NULL placeholder (not a real date)
-    """
-    if pd.isna(serial_value) or serial_value is None:
-        return pd.NaT
-    
-    try:
-        serial_num = float(serial_value)
-        
-        # CRITICAL: 25569 is Excel's representation of 1970-01-01 
-        # This is used as a placeholder for "no FTD date" - treat as NULL
-        if serial_num == 25569 or serial_num == 0:
-            return pd.NaT
-        
-        # Only convert serials > 25569 (post-1970 dates)
-        if serial_num > 25569:
-            # Excel epoch: December 30, 1899
-            date_val = pd.to_datetime(serial_num, origin='1899-12-30', unit='D')
-            return date_val
-        else:
-            # Invalid/placeholder serial
-            return pd.NaT
-            
-    except (ValueError, TypeError, OverflowError):
-        return pd.NaT
+uploaded_files = st.file_uploader("Upload Excel or CSV files", type=UPLOAD_TYPES, accept_multiple_files=True,
+                                  help="Exports split by region can be uploaded together; they are read in parallel and combined.")
 
 @st.cache_data
-def load_and_process_data(file):
-    """Load Excel file and properly handle serial dates"""
+def load_and_process_data(dataset_key, _files):
+    """Load Excel/CSV exports through the shared ingest layer (serial 25569 and 1/1/1970 = no FTD); cached on their content digest"""
     
-    # Read Excel file without auto-converting dates
-    df = pd.read_excel(file, keep_default_na=False, na_values=['', 'None', 'null'])
+    df = load_dataset(_files)
+    ftd_col = df.attrs['ftd_date_col']
     
     st.write("### 🔍 Raw Data Analysis")
-    st.write(f"**Total records loaded:** {len(df):,}")
-    
-    # Show raw FTD column data
-    ftd_col = 'portal - ftd_time'
-    if ftd_col in df.columns:
-        raw_ftd = df[ftd_col].copy()
-        
-        # Analyze raw values
-        st.write(f"**Raw FTD column type:** {raw_ftd.dtype}")
-        st.write("**First 10 raw values:**")
-        for i, val in enumerate(raw_ftd.head(10)):
-            st.text(f"  Row {i+1}: {repr(val)} (type: {type(val).__name__})")
-        
-        # Count serial 25569 (placeholder)
-        if raw_ftd.dtype in ['int64', 'float64', 'object']:
-            try:
-                numeric_vals = pd.to_numeric(raw_ftd, errors='coerce')
-                placeholder_count = (numeric_vals == 25569).sum()
-                valid_serial_count = (numeric_vals > 25569).sum()
-                
-                st.write(f"**Serial 25569 (NULL placeholder):** {placeholder_count:,}")
-                st.write(f"**Valid serials (>25569):** {valid_serial_count:,}")
-                
-                # Show sample conversions
-                if valid_serial_count > 0:
-                    st.write("**Sample serial → date conversions:**")
-                    valid_serials = numeric_vals[numeric_vals > 25569].head(5)
-                    for serial in valid_serials:
-                        if not pd.isna(serial):
-                            date_val = convert_excel_serial_to_date(serial)
-                            st.text(f"  Serial {int(serial)} → {date_val}")
-            except Exception as e:
-                st.error(f"Error analyzing serials: {e}")
-        
-        # Convert FTD dates
-        st.write("**Converting FTD dates...**")
-        df[ftd_col] = raw_ftd.apply(convert_excel_serial_to_date)
-        
-        # Post-conversion analysis
-        valid_ftd_count = df[ftd_col].notna().sum()
-        null_ftd_count = df[ftd_col].isna().sum()
-        
-        st.write(f"**✅ Valid FTD dates after conversion:** {valid_ftd_count:,}")
-        st.write(f"**📝 NULL FTD dates (no deposit yet):** {null_ftd_count:,}")
-        
-        if valid_ftd_count > 0:
-            date_range = f"{df[ftd_col].min():%Y-%m-%d} to {df[ftd_col].max():%Y-%m-%d}"
-            st.write(f"**📅 FTD date range:** {date_range}")
-    
-    # Handle other required columns
-    source_col = 'portal - source_marketing_campaign'
-    kyc_col = 'DATE_CREATED'
-    
-    # Fill missing sources
-    if source_col in df.columns:
-        df[source_col] = df[source_col].fillna("(Unknown)")
-        source_count = df[source_col].nunique()
-        st.write(f"**📊 Unique sources:** {source_count:,}")
+    st.write(f"**Total records loaded:** {df.attrs['original_count']:,}")
+    st.write(f"**Date encodings detected:** {', '.join(f'{col}: {enc}' for col, enc in df.attrs['date_encodings'].items())}")
+    st.write(f"**NULL placeholders (serial 25569 / 1/1/1970):** {df.attrs['placeholder_count']:,}")
     
-    # Process KYC dates
-    if kyc_col in df.columns:
-        df[kyc_col] = pd.to_datetime(df[kyc_col], errors='coerce', dayfirst=True)
-        valid_kyc = df[kyc_col].notna().sum()
-        st.write(f"**✅ Valid KYC dates:** {valid_kyc:,}")
+    valid_ftd_count = df[ftd_col].notna().sum()
+    st.write(f"**✅ Valid FTD dates after conversion:** {valid_ftd_count:,}")
+    st.write(f"**📝 NULL FTD dates (no deposit yet or outside 2023-2026):** {len(df) - valid_ftd_count:,}")
+    if valid_ftd_count > 0:
+        st.write(f"**📅 FTD date range:** {df[ftd_col].min():%Y-%m-%d} to {df[ftd_col].max():%Y-%m-%d}")
     
-    # Create month columns
-    df['ftd_month'] = df[ftd_col].dt.to_period('M').dt.to_timestamp()
-    df['kyc_month'] = df[kyc_col].dt.to_period('M').dt.to_timestamp()
+    st.write(f"**📊 Unique sources:** {df[df.attrs['source_col']].nunique():,}")
+    st.write(f"**✅ Valid KYC dates:** {df[df.attrs['kyc_date_col']].notna().sum():,}")
     
     return df
 
-if uploaded_file:
+if uploaded_files:
     try:
-        df = load_and_process_data(uploaded_file)
+        df = load_and_process_data(upload_key(uploaded_files, st.session_state.setdefault("upload_digests", {})), uploaded_files)
         
         # Dashboard content
         st.markdown("---")
@@ -229,14 +145,15 @@ if uploaded_file:
         st.exception(e)
 
 else:
-    st.info("👆 Please upload an Excel file to get started")
+    st.info("👆 Please upload an Excel or CSV file to get started")
     
     st.markdown("### 📋 Expected Excel Format")
     st.markdown("""
     Your Excel file should contain these columns:
-    - **portal - ftd_time**: FTD dates (Excel serial numbers)
+    - **portal - ftd_time**: FTD dates (Excel serial numbers, or DD/MM/YYYY in CSV exports)
     - **DATE_CREATED**: KYC dates 
     - **portal - source_marketing_campaign**: Source/campaign names
+    - **portal - country**: Client country
     - **Record ID**: Unique identifier for each client
     
     **Key Fix:** Serial number 25569 (1970-01-01) will be treated as NULL (no FTD), not as a real date.
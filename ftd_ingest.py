@@ -0,0 +1,664 @@
+"""
+Reading CRM exports into the processed dataframe both dashboards work from.
+
+An upload can be several CSV files (e.g. one per region) and/or Excel
+workbooks with several sheets. Workbooks are streamed straight from the sheet
+XML (``read_xlsx_raw``) so date cells keep their raw Excel serial numbers
+instead of being auto-converted by ``pd.read_excel`` (which turns the 25569
+"no FTD" placeholder into a real 1970 date). Every file is read in its own worker thread,
+checked against the required columns, renamed to one canonical set of column
+names, its date columns parsed (with the encoding detected for that file) and
+concatenated in file order; records repeated within or across files
+are then resolved on ``Record ID`` by the duplicate policy (``deduplicate``).
+Per-file row counts and quality stats are returned alongside so the Data
+Quality Report can show where rows came from.
+
+Compressed exports (``.csv.gz``, ``.csv.zst``, ``.zip`` of CSVs and/or
+workbooks) are decompressed as a stream straight into a chunked CSV parse, so
+the decompressed text is never held in memory as a whole.
+
+``load_dataset`` is the single entry point for ``ftd_dashboard.py`` and
+``ftd_dashboard_new.py``: the file format is detected from the content (not
+the extension) and the date encoding of each date column (DD/MM/YYYY text,
+Excel serials, or a mix) from a sample of its values, so each column goes
+straight to the parser that fits it.
+"""
+
+import gzip
+import hashlib
+import io
+import logging
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree.ElementTree import iterparse, parse
+
+import numpy as np
+import pandas as pd
+
+from ftd_backend import CLIENT_KEY, DATE_PATTERN, EXCEL_NULL_SERIAL, client_keys, excel_serial_to_datetime, fill_excel_serials, get_backend
+from ftd_quality import placeholder_mask, profile_quality, report_summary
+
+logger = logging.getLogger("ftd.ingest")
+
+# Level of the dashboard's "ftd.*" loggers (DEBUG adds raw samples of every load; default WARNING)
+LOG_LEVEL_ENV_VAR = "FTD_LOG_LEVEL"
+
+try:
+    import pyarrow  # noqa: F401  (optional: multi-threaded CSV parsing)
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional (only needed for .zst uploads)
+    zstandard = None
+
+RECORD_ID = "Record ID"
+
+# df.attrs key -> expected column name (matched case-insensitively)
+REQUIRED_COLUMNS = {
+    "ftd_date_col": "portal - ftd_time",
+    "kyc_date_col": "DATE_CREATED",
+    "source_col": "portal - source_marketing_campaign",
+    "country_col": "portal - country",
+}
+
+# Date columns parsed per file, and the per-file stats key recording each one's detected encoding
+DATE_ENCODING_STATS = {
+    REQUIRED_COLUMNS["ftd_date_col"]: "ftd_encoding",
+    REQUIRED_COLUMNS["kyc_date_col"]: "kyc_encoding",
+}
+
+# FTD values the CRM writes when a client has not deposited yet: text exports, and Excel serial 25569
+# (compared as a number, since exporters write it as "25569" or "25569.0")
+PLACEHOLDER_DATES = ["1/1/1970", "01/01/1970", "1/01/1970"]
+PLACEHOLDER_SERIALS = [EXCEL_NULL_SERIAL]
+
+# Column checks run by profile_quality on every load
+QUALITY_SCHEMA = {
+    REQUIRED_COLUMNS["ftd_date_col"]: {"kind": "date", "placeholders": PLACEHOLDER_DATES, "placeholder_serials": PLACEHOLDER_SERIALS},
+    REQUIRED_COLUMNS["kyc_date_col"]: {"kind": "date"},
+    REQUIRED_COLUMNS["source_col"]: {"kind": "text"},
+    REQUIRED_COLUMNS["country_col"]: {"kind": "text"},
+    RECORD_ID: {"kind": "id"},
+}
+
+# What to do with rows sharing a Record ID: keep the one with the latest FTD date, keep the first one,
+# or keep all of them (flagged in DUPLICATE_FLAG) and count distinct clients instead of rows
+DUPLICATE_POLICY_ENV_VAR = "FTD_DUPLICATE_POLICY"
+DUPLICATE_POLICIES = ("latest_ftd", "first", "flag")
+DEFAULT_DUPLICATE_POLICY = "latest_ftd"
+DUPLICATE_FLAG = "duplicate_record"
+# Position of the file/sheet each row came from while parts are combined (dropped by deduplicate)
+PART_COL = "_part"
+
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm")
+COMPRESSED_EXTENSIONS = (".gz", ".zst", ".zip")
+
+# Extensions offered by the upload widgets
+UPLOAD_TYPES = ["csv", "xlsx", "gz", "zst", "zip"]
+
+# Files looked for next to the app when nothing is uploaded, in order
+LOCAL_SOURCES = ("source.csv", "source.csv.gz", "source.csv.zst", "source.zip", "source.xlsx")
+
+# Leading bytes of the formats read_file understands; anything else is read as plain CSV
+ZIP_MAGIC = b"PK\x03\x04"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Rows per chunk when parsing a decompressing stream
+CSV_CHUNK_ROWS = 50_000
+
+# Non-blank values sampled per date column to detect its encoding
+DATE_SAMPLE_SIZE = 2000
+
+# Raw rows / FTD values kept for the debug expander
+DIAGNOSTIC_ROWS = 5
+DIAGNOSTIC_VALUES = 10
+
+
+def find_column(columns, name):
+    """Actual column matching ``name`` case-insensitively (surrounding spaces ignored), or None"""
+    wanted = name.strip().lower()
+    for column in columns:
+        if str(column).strip().lower() == wanted:
+            return column
+    return None
+
+
+def resolve_columns(columns):
+    """Map of attrs key -> actual column name, and the list of required columns that are missing"""
+    found = {key: find_column(columns, name) for key, name in REQUIRED_COLUMNS.items()}
+    missing = [REQUIRED_COLUMNS[key] for key, column in found.items() if column is None]
+    return found, missing
+
+
+def content_digest(data):
+    """Short blake2b digest of a file's bytes, identifying its content independently of name and mtime"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_digest(path, block_size=1 << 20):
+    """content_digest of a file on disk, read in blocks"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def dataset_key(digests):
+    """One cache key for a dataset built from files with the given content digests (order matters)"""
+    return content_digest("|".join(digests).encode())
+
+
+def upload_key(files, memo):
+    """
+    dataset_key of a set of uploaded files. Each file is hashed once: its digest is kept in ``memo`` (e.g. a dict
+    in st.session_state) under the upload's file_id, so later reruns only look it up.
+    """
+    digests = []
+    for file in files:
+        file_id = getattr(file, "file_id", None) or _file_name(file)
+        if file_id not in memo:
+            memo[file_id] = content_digest(_file_bytes(file))
+        digests.append(memo[file_id])
+    return dataset_key(digests)
+
+
+def configure_logging(level=None):
+    """Send the dashboard's log records to stderr at FTD_LOG_LEVEL (once per process)"""
+    ftd_logger = logging.getLogger("ftd")
+    ftd_logger.setLevel((level or os.environ.get(LOG_LEVEL_ENV_VAR, "WARNING")).upper())
+    if not ftd_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        ftd_logger.addHandler(handler)
+        ftd_logger.propagate = False
+    return ftd_logger
+
+
+def _file_name(file):
+    return getattr(file, "name", None) or os.path.basename(str(file))
+
+
+def _file_bytes(file):
+    """Contents of an uploaded file, file-like object or path"""
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    if hasattr(file, "read"):
+        return file.read()
+    with open(file, "rb") as f:
+        return f.read()
+
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_CELL_REF = re.compile(r"[A-Z]+")
+
+
+def _column_index(ref):
+    """0-based column of a cell reference like 'AB12'"""
+    index = 0
+    for letter in _CELL_REF.match(ref).group():
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def _shared_strings(zf):
+    """The workbook's shared string table (text of every <si>, rich-text runs joined)"""
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return []
+    strings = []
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, elem in iterparse(f):
+            if elem.tag == _MAIN_NS + "si":
+                strings.append("".join(t.text or "" for t in elem.iter(_MAIN_NS + "t")))
+                elem.clear()
+    return strings
+
+
+def _sheet_paths(zf):
+    """(sheet name, path inside the zip) for every worksheet, in workbook order"""
+    with zf.open("xl/_rels/workbook.xml.rels") as f:
+        targets = {rel.get("Id"): rel.get("Target") for rel in parse(f).getroot().iter(_PKG_REL_NS + "Relationship")}
+    with zf.open("xl/workbook.xml") as f:
+        sheets = parse(f).getroot().iter(_MAIN_NS + "sheet")
+        paths = []
+        for sheet in sheets:
+            target = targets[sheet.get(_REL_NS + "id")]
+            paths.append((sheet.get("name"), target.lstrip("/") if target.startswith("/") else f"xl/{target}"))
+    return paths
+
+
+def _sheet_rows(zf, path, strings):
+    """Stream a worksheet as {column index: raw text} per row; numbers (incl. date serials) are left unconverted"""
+    with zf.open(path) as f:
+        for _, elem in iterparse(f):
+            if elem.tag != _MAIN_NS + "row":
+                continue
+            row = {}
+            for position, cell in enumerate(elem.iter(_MAIN_NS + "c")):
+                kind = cell.get("t")
+                if kind == "inlineStr":
+                    value = "".join(t.text or "" for t in cell.iter(_MAIN_NS + "t"))
+                else:
+                    v = cell.find(_MAIN_NS + "v")
+                    value = None if v is None else v.text
+                    if kind == "s" and value is not None:
+                        value = strings[int(value)]
+                ref = cell.get("r")
+                row[_column_index(ref) if ref else position] = value
+            yield row
+            elem.clear()
+
+
+def read_xlsx_raw(data, columns=None):
+    """
+    Every sheet of an xlsx workbook as a dataframe of raw cell text, in one streaming pass over the sheet XML.
+    Numeric cells (including dates, which Excel stores as serial day numbers) come back as their stored
+    number text, so no date is converted before the dashboard's own parser sees it.
+    When ``columns`` is given only those headers (case-insensitive) are kept; other cells are skipped.
+    ``data`` is the workbook's bytes or a seekable binary file (such as a member of an outer zip).
+    """
+    wanted = {c.strip().lower() for c in columns} if columns is not None else None
+    sheets = {}
+    with zipfile.ZipFile(_as_file(data)) as zf:
+        strings = _shared_strings(zf)
+        for name, path in _sheet_paths(zf):
+            rows = _sheet_rows(zf, path, strings)
+            header = next(rows, {})
+            keep = {
+                index: str(title).strip() for index, title in sorted(header.items())
+                if title is not None and (wanted is None or str(title).strip().lower() in wanted)
+            }
+            values = {index: [] for index in keep}
+            for row in rows:
+                for index, column in values.items():
+                    column.append(row.get(index))
+            sheets[name] = pd.DataFrame({keep[index]: pd.Series(column, dtype=object) for index, column in values.items()})
+    return sheets
+
+
+def find_local_source(directory="."):
+    """First of LOCAL_SOURCES present in ``directory``, or None"""
+    for name in LOCAL_SOURCES:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _as_file(data):
+    """Seekable binary file object for bytes or an already open file (e.g. a zip member)"""
+    return io.BytesIO(data) if isinstance(data, bytes) else data
+
+
+def detect_format(name, data):
+    """
+    'xlsx', 'zip', 'csv.gz', 'csv.zst' or 'csv', from the file's leading bytes (the extension only breaks ties
+    for empty files). A zip is a workbook when it holds xl/workbook.xml, otherwise an archive of exports.
+    ``data`` is bytes or a seekable binary file, which is rewound afterwards.
+    """
+    if isinstance(data, bytes):
+        head = data[:4]
+    else:
+        head = data.read(4)
+        data.seek(0)
+    if head.startswith(ZIP_MAGIC):
+        with zipfile.ZipFile(_as_file(data)) as zf:
+            is_workbook = "xl/workbook.xml" in zf.namelist()
+        if not isinstance(data, bytes):
+            data.seek(0)
+        return "xlsx" if is_workbook else "zip"
+    if head.startswith(GZIP_MAGIC):
+        return "csv.gz"
+    if head.startswith(ZSTD_MAGIC):
+        return "csv.zst"
+    if not head and name.lower().endswith(EXCEL_EXTENSIONS):
+        return "xlsx"
+    return "csv"
+
+
+def _decompressing_stream(data, file_format):
+    """Readable stream of the decompressed bytes of a .gz / .zst export (bytes or a binary file)"""
+    if file_format == "csv.gz":
+        return gzip.GzipFile(fileobj=_as_file(data))
+    if zstandard is None:
+        raise ValueError("Reading .zst files requires the zstandard package (pip install zstandard)")
+    return zstandard.ZstdDecompressor().stream_reader(_as_file(data))
+
+
+def _read_csv_stream(stream):
+    """All-string CSV parsed chunk by chunk from a byte stream, so decompressed text is only buffered per chunk"""
+    with stream:
+        return pd.concat(pd.read_csv(stream, dtype=str, chunksize=CSV_CHUNK_ROWS), ignore_index=True)
+
+
+def _raw_parts(name, data):
+    """
+    (label, all-string frame) for every table in a file: one per CSV, per sheet, or per member of a zip.
+    ``data`` is the file's bytes or, for a zip member, the open member, which is read as a stream so a
+    member is never decompressed into memory as a whole.
+    """
+    file_format = detect_format(name, data)
+    if file_format == "xlsx":
+        sheets = read_xlsx_raw(_as_file(data), columns=[*REQUIRED_COLUMNS.values(), RECORD_ID])
+        return [(f"{name} [{sheet}]", frame) for sheet, frame in sheets.items()]
+    if file_format == "zip":
+        parts = []
+        with zipfile.ZipFile(_as_file(data)) as zf:
+            for member in zf.infolist():
+                member_name = member.filename.lower()
+                label = f"{name}/{member.filename}"
+                if member.is_dir() or member_name.startswith("__macosx/"):
+                    continue
+                if member_name.endswith(".csv"):
+                    parts.append((label, _read_csv_stream(zf.open(member))))
+                elif member_name.endswith(EXCEL_EXTENSIONS + COMPRESSED_EXTENSIONS):
+                    with zf.open(member) as stream:
+                        parts.extend(_raw_parts(label, stream))
+        if not parts:
+            raise ValueError(f"{name} does not contain any CSV or Excel files")
+        return parts
+    if file_format in ("csv.gz", "csv.zst"):
+        return [(name, _read_csv_stream(_decompressing_stream(data, file_format)))]
+    if not isinstance(data, bytes):
+        return [(name, _read_csv_stream(data))]
+    return [(name, pd.read_csv(io.BytesIO(data), dtype=str, engine=CSV_ENGINE))]
+
+
+def read_file(file, backend=None):
+    """
+    Read one file into canonical raw parts, parsing each part's date columns in the calling (worker) thread.
+    Returns (list of (label, frame, parsed) where frame has the required columns renamed to REQUIRED_COLUMNS
+    names and the ID column to RECORD_ID and parsed holds its parsed date columns, list of per-part stats
+    dicts). Raises ValueError if no part has the required columns.
+    """
+    backend = backend or get_backend()
+    name = _file_name(file)
+    raw_parts = _raw_parts(name, _file_bytes(file))
+
+    parts, stats, problems = [], [], []
+    for label, frame in raw_parts:
+        found, missing = resolve_columns(frame.columns)
+        if missing:
+            problems.append(f"{label}: missing {missing}")
+            stats.append({"file": label, "rows": len(frame), "status": f"skipped (missing {', '.join(missing)})"})
+            continue
+        renames = {found[key]: REQUIRED_COLUMNS[key] for key in REQUIRED_COLUMNS}
+        # The ID header is matched like the required ones, so cross-file duplicates are found whatever its case
+        record_id = find_column(frame.columns, RECORD_ID)
+        if record_id is not None:
+            renames[record_id] = RECORD_ID
+        frame = frame.rename(columns=renames)
+        # Each part is parsed with its own encoding (a blank column has none), so files written differently
+        # (CSV text vs workbook serials) each go straight to the parser that fits them
+        encodings = {col: detect_date_encoding(frame[col]) if frame[col].notna().any() else None for col in DATE_ENCODING_STATS}
+        parsed = pd.DataFrame({col: parse_date_column(frame[col], backend, encodings[col]) for col in DATE_ENCODING_STATS})
+        ftd = frame[REQUIRED_COLUMNS["ftd_date_col"]].str.strip()
+        stats.append({
+            "file": label,
+            "rows": len(frame),
+            "status": "ok",
+            "no_ftd_placeholders": int(placeholder_mask(ftd, PLACEHOLDER_DATES, PLACEHOLDER_SERIALS).sum()),
+            "blank_ftd": int(ftd.isna().sum() + (ftd == "").sum()),
+            "blank_kyc": int(frame[REQUIRED_COLUMNS["kyc_date_col"]].isna().sum()),
+            "unknown_source": int(frame[REQUIRED_COLUMNS["source_col"]].isna().sum()),
+            "duplicate_ids": int(frame[RECORD_ID].duplicated().sum()) if RECORD_ID in frame.columns else 0,
+            **{key: encodings[col] for col, key in DATE_ENCODING_STATS.items()},
+        })
+        parts.append((label, frame, parsed))
+
+    if not parts:
+        raise ValueError(
+            f"{name} is missing required columns ({'; '.join(problems)}). "
+            f"Expected: {list(REQUIRED_COLUMNS.values())} (case-insensitive)."
+        )
+    return parts, stats
+
+
+def read_uploads(files, max_workers=None, reader=read_file, backend=None):
+    """
+    Read and date-parse one or more files in parallel and combine them.
+    Returns (raw all-string dataframe with canonical required column names, parsed date columns aligned with it,
+    per-file stats dataframe). Rows are concatenated in file order with their part's position in PART_COL;
+    records repeated across files are left for ``deduplicate`` to resolve under the duplicate policy.
+    ``reader`` reads a single file (read_file, or a memoized version of it) with ``backend``.
+    """
+    files = list(files) if isinstance(files, (list, tuple)) else [files]
+    if not files:
+        raise ValueError("No files to load")
+    backend = backend or get_backend()
+    workers = max_workers or min(len(files), os.cpu_count() or 1)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda file: reader(file, backend), files))
+    else:
+        results = [reader(file, backend) for file in files]
+
+    parts = [part for file_parts, _ in results for part in file_parts]
+    stats = pd.DataFrame([s for _, file_stats in results for s in file_stats]).convert_dtypes()
+    stats["duplicates_removed"] = 0
+    combined = pd.concat([frame.assign(**{PART_COL: index}) for index, (_, frame, _) in enumerate(parts)], ignore_index=True)
+    parsed = pd.concat([part_parsed for _, _, part_parsed in parts], ignore_index=True)
+    return combined, parsed, stats
+
+
+def combine_encodings(encodings):
+    """Date encoding of a column read from several parts: theirs if they agree, else 'mixed' (blank parts ignored)"""
+    found = {encoding for encoding in encodings if not pd.isna(encoding)}
+    if not found:
+        return "dd/mm/yyyy"
+    return found.pop() if len(found) == 1 else "mixed"
+
+
+def detect_date_encoding(values, sample_size=DATE_SAMPLE_SIZE):
+    """
+    How a raw date column is written, judged from a sample of its non-blank values:
+    'dd/mm/yyyy' (CSV text), 'excel_serial' (numeric xlsx cells) or 'mixed' (anything else, e.g. a workbook
+    where some cells were typed as text).
+    """
+    sample = values.dropna().astype(str).str.strip()
+    sample = sample[sample != ""]
+    if len(sample) > sample_size:
+        sample = sample.sample(sample_size, random_state=0)
+    if sample.empty:
+        return "dd/mm/yyyy"
+    if sample.str.fullmatch(r"\d+(?:\.\d+)?").all():
+        return "excel_serial"
+    if sample.str.match(DATE_PATTERN).all():
+        return "dd/mm/yyyy"
+    return "mixed"
+
+
+def parse_date_column(values, backend, encoding=None):
+    """
+    Parse a raw date column, placeholders and unparseable values becoming NaT. The (sampled) encoding picks the
+    parser run over the whole column; values it cannot read (e.g. a sheet typed differently from the rest of
+    the upload) are retried with the other parser, which only touches those values.
+    """
+    encoding = encoding or detect_date_encoding(values)
+    if encoding == "excel_serial":
+        # Serial 25569 (1970-01-01) is the "no date" placeholder and is dropped with everything below it
+        parsed = excel_serial_to_datetime(values)
+        text = parsed.isna() & values.notna() & pd.to_numeric(values, errors="coerce").isna()
+        if text.any():
+            parsed = parsed.mask(text, backend.parse_dates(values[text]))
+        return parsed
+    return fill_excel_serials(backend.parse_dates(values), values)
+
+
+def build_diagnostics(df, encodings, placeholder_count):
+    """Small sample of the raw data (a few rows and FTD values) plus load counts, for format_diagnostics"""
+    df = df.drop(columns=PART_COL, errors="ignore")
+    head = df.head(DIAGNOSTIC_ROWS)
+    return {
+        "columns": [str(col) for col in df.columns],
+        "head": head.astype(object).where(head.notna(), None).to_dict(orient="list"),
+        "ftd_samples": df[REQUIRED_COLUMNS["ftd_date_col"]].head(DIAGNOSTIC_VALUES).tolist(),
+        "total_records": len(df),
+        "placeholder_count": placeholder_count,
+        "date_encodings": dict(encodings),
+    }
+
+
+def format_diagnostics(diagnostics):
+    """Text for the "RAW CSV DEBUG INFO" expander, rendered only when it is shown"""
+    lines = ["📄 RAW CSV DATA - First rows:", pd.DataFrame(diagnostics["head"]).to_string()]
+    lines.append(f"\n📋 EXACT column names: {[repr(col) for col in diagnostics['columns']]}")
+    lines.append(f"\n📅 First values from '{REQUIRED_COLUMNS['ftd_date_col']}':")
+    lines.extend(f"  Row {i + 1}: {value!r}" for i, value in enumerate(diagnostics["ftd_samples"]))
+    lines.append("\n📊 FTD DATA SUMMARY:")
+    lines.append(f"  Total records: {diagnostics['total_records']}")
+    lines.append(f"  Placeholder dates (1/1/1970): {diagnostics['placeholder_count']}")
+    lines.append(f"  Potential FTD records: {diagnostics['total_records'] - diagnostics['placeholder_count']}")
+    lines.append(f"  Date encodings detected: {diagnostics['date_encodings']}")
+    return "\n".join(lines)
+
+
+def get_duplicate_policy(policy=None):
+    """Duplicate Record ID policy: the given one, else FTD_DUPLICATE_POLICY, else latest_ftd"""
+    policy = (policy or os.environ.get(DUPLICATE_POLICY_ENV_VAR, DEFAULT_DUPLICATE_POLICY)).strip().lower()
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicate policy {policy!r}; expected one of {', '.join(DUPLICATE_POLICIES)}")
+    return policy
+
+
+def deduplicate(df, policy, ftd_col):
+    """
+    Apply a duplicate Record ID policy (see DUPLICATE_POLICIES) and add the CLIENT_KEY column.
+    Rows of one client in different files are resolved like rows within a file: PART_COL (the file order) breaks
+    ties, so "first" keeps the earliest file's row and "latest_ftd" prefers the later file on equal FTD dates.
+    Returns (dataframe without PART_COL, dict with the policy, duplicate_ids, duplicate_rows, rows removed and
+    rows removed per part).
+    """
+    keys = client_keys(df[RECORD_ID]) if RECORD_ID in df.columns else pd.Series(np.arange(len(df)), index=df.index)
+    codes = keys.to_numpy()
+    part = df[PART_COL].to_numpy() if PART_COL in df.columns else np.zeros(len(df), dtype=np.int64)
+    df = df.drop(columns=PART_COL, errors="ignore")
+    per_client = np.bincount(codes, minlength=1)
+    repeated = per_client[codes] > 1
+    info = {
+        "policy": policy,
+        "duplicate_ids": int((per_client > 1).sum()),
+        "duplicate_rows": int(repeated.sum() - (per_client > 1).sum()),
+        "removed": 0,
+        "removed_per_part": {},
+    }
+    if policy == "flag" or not repeated.any():
+        df = df.assign(**{CLIENT_KEY: keys})
+        if policy == "flag":
+            df[DUPLICATE_FLAG] = repeated
+        return df, info
+
+    rows = np.arange(len(df))
+    if policy == "first":
+        # Stable sort by client, then file order; the first row of each client wins
+        order = np.lexsort((rows, part, codes))
+        winners = np.insert(codes[order][1:] != codes[order][:-1], 0, True)
+    else:
+        # Stable sort by client, then FTD date (NaT first), then file order; the last row of each client wins,
+        # so ties go to the later file (and the later row within it)
+        ftd = df[ftd_col].to_numpy(dtype="datetime64[ns]").view("int64")
+        order = np.lexsort((rows, part, ftd, codes))
+        winners = np.append(codes[order][1:] != codes[order][:-1], True)
+    keep = np.zeros(len(df), dtype=bool)
+    keep[order[winners]] = True
+    info["removed"] = int((~keep).sum())
+    removed_parts, removed_counts = np.unique(part[~keep], return_counts=True)
+    info["removed_per_part"] = {int(p): int(n) for p, n in zip(removed_parts, removed_counts)}
+    return df[keep].assign(**{CLIENT_KEY: keys[keep]}).reset_index(drop=True), info
+
+
+def load_dataset(files, backend=None, reader=read_file, duplicate_policy=None):
+    """
+    Read, combine and process one or more CRM exports into the dataframe both dashboards use.
+
+    Dates are parsed (placeholders and dates outside the valid window blanked), missing sources and countries
+    filled with "(Unknown)", and ``ftd_month`` / ``kyc_month`` added. Column names, the per-column quality
+    report (ftd_quality.profile_quality) and loading diagnostics are stored in ``df.attrs``. Rows sharing a
+    Record ID are handled by ``duplicate_policy`` (get_duplicate_policy). ``reader`` is passed on to read_uploads.
+    """
+    backend = backend or get_backend()
+    duplicate_policy = get_duplicate_policy(duplicate_policy)
+    # Read every file (in parallel) with ALL columns as strings to prevent pandas auto-parsing dates incorrectly;
+    # required columns are checked and renamed to the standard names, and each file's dates parsed in its worker
+    df, parsed, file_stats = read_uploads(files, reader=reader, backend=backend)
+    original_count = len(df)
+
+    ftd_date_col = REQUIRED_COLUMNS["ftd_date_col"]
+    kyc_date_col = REQUIRED_COLUMNS["kyc_date_col"]
+    source_col = REQUIRED_COLUMNS["source_col"]
+    country_col = REQUIRED_COLUMNS["country_col"]
+
+    date_cols = [ftd_date_col, kyc_date_col]
+    loaded = file_stats[file_stats["status"] == "ok"]
+    encodings = {col: combine_encodings(loaded[DATE_ENCODING_STATS[col]]) for col in date_cols}
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Raw data, first rows:\n%s", df.head().to_string())
+        logger.debug("Columns: %s", list(df.columns))
+        logger.debug("First raw %r values: %s", ftd_date_col, df[ftd_date_col].head(DIAGNOSTIC_VALUES).tolist())
+    logger.debug("Date encodings detected: %s", encodings)
+
+    # Profile every required column in one pass; its masks blank placeholder and out-of-range dates
+    quality, blank_out = profile_quality(df, parsed, QUALITY_SCHEMA)
+    ftd_quality = report_summary(quality, ftd_date_col)
+    kyc_quality = report_summary(quality, kyc_date_col)
+    placeholder_count = ftd_quality["placeholders"]
+    diagnostics = build_diagnostics(df, encodings, placeholder_count)
+    for col in date_cols:
+        df[col] = parsed[col].mask(blank_out[col])
+    logger.info(
+        "Loaded %d rows from %d part(s): %d valid FTD dates (%d placeholders, %d unparseable, %d before 2023, %d after 2026), "
+        "%d valid KYC dates",
+        len(df), len(file_stats), ftd_quality["valid"], placeholder_count, ftd_quality["format_mismatch"],
+        ftd_quality["before_min"], ftd_quality["after_max"], kyc_quality["valid"],
+    )
+
+    # One row per client (unless the policy only flags duplicates); CLIENT_KEY identifies clients either way
+    df, duplicates = deduplicate(df, duplicate_policy, ftd_date_col)
+    if duplicates["duplicate_ids"]:
+        logger.info("%d Record IDs appear more than once (%d extra rows); policy %s removed %d rows",
+                    duplicates["duplicate_ids"], duplicates["duplicate_rows"], duplicate_policy, duplicates["removed"])
+    # Rows each file/sheet lost to the policy (parts are numbered in the order of the "ok" stats rows)
+    removed = pd.Series(duplicates.pop("removed_per_part"), dtype="int64")
+    loaded = file_stats["status"] == "ok"
+    file_stats.loc[loaded, "duplicates_removed"] = removed.reindex(range(int(loaded.sum())), fill_value=0).to_numpy()
+
+    # Fill missing sources and countries
+    df[source_col] = df[source_col].fillna("(Unknown)").astype(str).str.strip()
+    df[country_col] = df[country_col].fillna("(Unknown)").astype(str).str.strip()
+
+    # Create month columns for both dashboards
+    df["ftd_month"] = df[ftd_date_col].dt.to_period("M").dt.to_timestamp()
+    df["kyc_month"] = df[kyc_date_col].dt.to_period("M").dt.to_timestamp()
+
+    # Store diagnostic info
+    df.attrs['diagnostics'] = diagnostics
+    df.attrs['placeholder_count'] = placeholder_count
+    df.attrs['date_encodings'] = encodings
+    df.attrs['original_count'] = original_count
+    # Invalid = a value that is not blank or a placeholder but could not be used (unparseable or out of range)
+    df.attrs['invalid_ftd_dates'] = ftd_quality["format_mismatch"] + ftd_quality["before_min"] + ftd_quality["after_max"]
+    df.attrs['invalid_kyc_dates'] = kyc_quality["format_mismatch"] + kyc_quality["before_min"] + kyc_quality["after_max"]
+    df.attrs['ftd_before_2023'] = ftd_quality["before_min"]
+    df.attrs['kyc_before_2023'] = kyc_quality["before_min"]
+    df.attrs['ftd_future'] = ftd_quality["after_max"]
+    df.attrs['kyc_future'] = kyc_quality["after_max"]
+    df.attrs['quality_report'] = quality.to_dict(orient="records")
+    df.attrs['duplicates'] = duplicates
+    df.attrs['final_count'] = len(df)
+    df.attrs['file_stats'] = file_stats.astype(object).where(file_stats.notna(), None).to_dict(orient="records")
+
+    # Store the column names for later use
+    df.attrs['ftd_date_col'] = ftd_date_col
+    df.attrs['kyc_date_col'] = kyc_date_col
+    df.attrs['source_col'] = source_col
+    df.attrs['country_col'] = country_col
+
+    return df
@@ -0,0 +1,92 @@
+"""
+Schema-driven data quality profile of a loaded export.
+
+Each column is described once in a schema (its kind - ``date``, ``text`` or
+``id`` - and which values are "no data" placeholders, as text or as Excel
+serial numbers), and ``profile_quality``
+checks every column in one vectorized pass after the dates are parsed: blank
+values, placeholders, values that do not match the column's format, dates
+outside the valid window and repeated Record IDs. The result is a compact
+report with one row per column, stored by the ingest layer in ``df.attrs`` and
+shown in the Data Quality Report; the masks it builds are reused to blank
+placeholder and out-of-range dates, so no check is run twice.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ftd_backend import MAX_VALID_DATE, MIN_VALID_DATE
+
+# Raw values treated as blank (compared case-insensitively after stripping spaces)
+NULL_TOKENS = ["", "nan", "none", "null", "nat", "<na>"]
+
+# Columns of the quality report, in display order
+REPORT_COLUMNS = ["column", "kind", "rows", "blank", "placeholders", "format_mismatch",
+                  "before_min", "after_max", "duplicates", "valid"]
+
+
+def placeholder_mask(values, placeholders=(), serials=()):
+    """
+    Which raw values are "no data" placeholders: text matched case-insensitively after stripping spaces, and
+    Excel serials compared as numbers, so "25569", "25569.0" and " 25569 " all match serial 25569.
+    """
+    text = values.astype("string").str.strip().str.lower()
+    mask = text.isin([p.lower() for p in placeholders])
+    if serials:
+        mask |= pd.to_numeric(text, errors="coerce").isin(list(serials))
+    return mask.fillna(False).to_numpy(dtype=bool)
+
+
+def profile_quality(raw, parsed, schema):
+    """
+    Profile the schema's columns of a raw all-string frame; ``parsed`` holds the parsed (unfiltered) dates of its
+    date columns. Returns (report dataframe, one row per column, and a frame of the date cells to blank:
+    placeholders and dates outside MIN_VALID_DATE..MAX_VALID_DATE).
+    """
+    columns = [column for column in schema if column in raw.columns]
+    normalized = raw[columns].astype("string").apply(lambda values: values.str.strip().str.lower())
+    blank = (normalized.isna() | normalized.isin(NULL_TOKENS)).to_numpy()
+    placeholder = np.column_stack([
+        placeholder_mask(raw[column], schema[column].get("placeholders", ()), schema[column].get("placeholder_serials", ()))
+        for column in columns
+    ]) if columns else np.zeros((len(raw), 0), dtype=bool)
+
+    # All date columns are checked together as one (rows x date columns) array
+    dates = [column for column in columns if schema[column]["kind"] == "date"]
+    date_positions = [columns.index(column) for column in dates]
+    stamps = parsed[dates].to_numpy(dtype="datetime64[ns]")
+    has_value = ~(blank[:, date_positions] | placeholder[:, date_positions])
+    mismatch = np.isnat(stamps) & has_value
+    before = (stamps < np.datetime64(MIN_VALID_DATE)) & has_value
+    after = (stamps > np.datetime64(MAX_VALID_DATE)) & has_value
+
+    counts = {
+        "blank": blank.sum(axis=0),
+        "placeholders": placeholder.sum(axis=0),
+    }
+    date_counts = {"format_mismatch": mismatch.sum(axis=0), "before_min": before.sum(axis=0), "after_max": after.sum(axis=0)}
+
+    rows = []
+    for position, column in enumerate(columns):
+        kind = schema[column]["kind"]
+        row = {"column": column, "kind": kind, "rows": len(raw),
+               **{key: int(values[position]) for key, values in counts.items()},
+               "format_mismatch": 0, "before_min": 0, "after_max": 0, "duplicates": 0}
+        if kind == "date":
+            row.update({key: int(values[dates.index(column)]) for key, values in date_counts.items()})
+        elif kind == "id":
+            row["duplicates"] = int(raw[column][~blank[:, position]].duplicated().sum())
+        row["valid"] = len(raw) - row["blank"] - row["placeholders"] - row["format_mismatch"] - row["before_min"] - row["after_max"]
+        rows.append(row)
+
+    report = pd.DataFrame(rows, columns=REPORT_COLUMNS)
+    blank_out = pd.DataFrame(placeholder[:, date_positions] | before | after, index=raw.index, columns=dates)
+    return report, blank_out
+
+
+def report_summary(report, column):
+    """The report row of one column as a dict (all counts 0 when the column was not profiled)"""
+    match = report[report["column"] == column]
+    if match.empty:
+        return {key: 0 for key in REPORT_COLUMNS if key not in ("column", "kind")}
+    return match.iloc[0].to_dict()
@@ -0,0 +1,204 @@
+"""
+Approximate distinct counts and heavy hitters for very large exports.
+
+Instead of re-counting the filtered records, ``build_sketches`` summarizes the
+dataset once into one small sketch per (month, country) cell:
+
+- a HyperLogLog of client keys (distinct clients) and one of source names
+  (distinct sources), merged by taking the register-wise maximum;
+- a Space-Saving summary of the clients per source (heavy hitters), merged by
+  adding counts.
+
+A KPI or ranking for any month/country selection is then a merge of the
+selected cells, whose cost depends on the number of cells and the sketch size,
+not on the number of records.
+
+Error bounds:
+
+- HyperLogLog with precision ``p`` uses 2**p one-byte registers per cell; the
+  standard error of a distinct count is about ``1.04 / sqrt(2**p)`` (1.6% at
+  the default p=12), and small counts (below ~2.5 * 2**p) use linear counting,
+  which is nearly exact.
+- Space-Saving with capacity ``k`` keeps the k largest sources of every cell
+  (a cell with at most k sources is exact). Every reported count is an upper
+  bound with ``count - error <= true count <= count``, and any source not
+  reported has at most ``floor`` clients, so the true top sources are never
+  missed when their counts exceed the floor.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Default HyperLogLog precision (2**12 registers: ~1.6% standard error)
+DEFAULT_PRECISION = 12
+# Default number of sources kept by each Space-Saving summary
+DEFAULT_CAPACITY = 64
+
+
+def hash_values(values):
+    """64-bit hash of every value (pandas' hash_array, stable across runs)"""
+    return pd.util.hash_array(np.asarray(values))
+
+
+def hll_standard_error(precision=DEFAULT_PRECISION):
+    """Relative standard error of a HyperLogLog distinct count"""
+    return 1.04 / np.sqrt(2 ** precision)
+
+
+def hll_registers(hashes, cells, n_cells, precision=DEFAULT_PRECISION):
+    """
+    HyperLogLog registers (n_cells x 2**precision, uint8) of 64-bit hashes, where ``cells`` gives the cell
+    of every hash. The top ``precision`` bits pick the register, the rank is 1 + the leading zeros of the rest.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    buckets = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes << np.uint64(precision)
+    # Leading zeros from the top 53 bits, which convert to float64 exactly
+    top = (rest >> np.uint64(11)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        leading_zeros = 52 - np.floor(np.log2(top))
+    ranks = np.minimum(np.where(top > 0, leading_zeros + 1, 64), 64 - precision + 1).astype(np.uint8)
+    registers = np.zeros((n_cells, 2 ** precision), dtype=np.uint8)
+    np.maximum.at(registers, (np.asarray(cells, dtype=np.int64), buckets), ranks)
+    return registers
+
+
+def hll_estimate(registers):
+    """Distinct count estimated from one row of (merged) HyperLogLog registers"""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros > 0:
+        estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+    return int(round(estimate))
+
+
+EMPTY_TABLE = pd.DataFrame({"count": pd.Series(dtype="int64"), "error": pd.Series(dtype="int64")})
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters summary: at most ``capacity`` items with an upper-bound count and the maximum
+    overestimate (error) of each, plus ``floor``, an upper bound on the count of any item not kept.
+    """
+
+    def __init__(self, table, floor=0, capacity=DEFAULT_CAPACITY):
+        self.table = table  # DataFrame indexed by item with "count" and "error", largest count first
+        self.floor = floor
+        self.capacity = capacity
+
+    @classmethod
+    def merge(cls, summaries, capacity=DEFAULT_CAPACITY):
+        """Merge summaries of disjoint data (see merge_tables)"""
+        summaries = list(summaries)
+        tables = [s.table for s in summaries]
+        parts = np.repeat(np.arange(len(summaries)), [len(t) for t in tables])
+        table = pd.concat(tables).assign(part=parts) if tables else EMPTY_TABLE.assign(part=0)
+        return merge_tables(table, np.array([s.floor for s in summaries], dtype=np.int64), capacity)
+
+    def top(self, n=None):
+        """The n largest items with count (upper bound), error and guaranteed count (lower bound)"""
+        table = self.table if n is None else self.table.head(n)
+        return table.assign(guaranteed=table["count"] - table["error"])
+
+
+def merge_tables(table, floors, capacity=DEFAULT_CAPACITY):
+    """
+    Merge the Space-Saving tables of disjoint parts, stacked in one frame with a "part" column (0..len(floors)-1).
+    An item missing from a part is counted at that part's floor (its largest possible count there), so counts
+    stay upper bounds and errors grow by those floors; the merged summary keeps the top ``capacity`` items.
+    """
+    total_floor = int(floors.sum())
+    if table.empty:
+        return SpaceSaving(EMPTY_TABLE, total_floor, capacity)
+    part_floors = floors[table["part"].to_numpy()]
+    merged = (
+        table[["count", "error"]].sub(part_floors, axis=0)
+        .groupby(level=0, sort=False).sum()
+        + total_floor
+    ).sort_values("count", ascending=False, kind="stable")
+    floor = max(total_floor, int(merged["count"].iloc[capacity])) if len(merged) > capacity else total_floor
+    return SpaceSaving(merged.iloc[:capacity], floor, capacity)
+
+
+class SketchCube:
+    """Distinct-client, distinct-source and heavy-hitter sketches per (month, country) cell"""
+
+    def __init__(self, cells, client_registers, source_registers, heavy_hitters, floors, precision, capacity):
+        self.cells = cells  # MultiIndex of (month, country)
+        self.client_registers = client_registers
+        self.source_registers = source_registers
+        self.heavy_hitters = heavy_hitters  # Space-Saving tables of every cell, stacked, with the cell as "part"
+        self.floors = floors
+        self.precision = precision
+        self.capacity = capacity
+
+    def _rows(self, months=None, countries=None):
+        mask = np.ones(len(self.cells), dtype=bool)
+        if months is not None:
+            mask &= self.cells.get_level_values(0).isin(list(months))
+        if countries is not None:
+            mask &= self.cells.get_level_values(1).isin(list(countries))
+        return np.flatnonzero(mask)
+
+    def _estimate(self, registers, rows):
+        if len(rows) == 0:
+            return 0
+        return hll_estimate(registers[rows].max(axis=0))
+
+    def distinct_clients(self, months=None, countries=None):
+        """Approximate number of distinct clients in the selected months and countries (None = all)"""
+        return self._estimate(self.client_registers, self._rows(months, countries))
+
+    def distinct_sources(self, months=None, countries=None):
+        """Approximate number of distinct sources in the selected months and countries (None = all)"""
+        return self._estimate(self.source_registers, self._rows(months, countries))
+
+    def top_sources(self, months=None, countries=None):
+        """Merged Space-Saving summary of the sources in the selected months and countries (None = all)"""
+        rows = self._rows(months, countries)
+        selected = self.heavy_hitters[self.heavy_hitters["part"].isin(rows)]
+        floors = np.zeros(len(self.floors), dtype=np.int64)
+        floors[rows] = self.floors[rows]
+        return merge_tables(selected, floors, self.capacity)
+
+    @property
+    def standard_error(self):
+        return hll_standard_error(self.precision)
+
+
+def build_sketches(df, month_col, source_col, country_col, key_col, precision=DEFAULT_PRECISION, capacity=DEFAULT_CAPACITY):
+    """
+    Build a SketchCube over the rows with a month. ``key_col`` identifies clients (e.g. CLIENT_KEY), so repeated
+    rows of one client are counted once.
+    """
+    rows = df[df[month_col].notna()]
+    month_codes, months = pd.factorize(rows[month_col], sort=True)
+    country_codes, countries = pd.factorize(rows[country_col], sort=True)
+    cell_codes, used = pd.factorize(month_codes * len(countries) + country_codes, sort=True)
+    cells = pd.MultiIndex.from_arrays([months[used // max(len(countries), 1)], countries[used % max(len(countries), 1)]],
+                                      names=["month", "country"])
+    source_codes, sources = pd.factorize(rows[source_col].astype(str))
+    keys = rows[key_col].to_numpy()
+
+    client_registers = hll_registers(hash_values(keys), cell_codes, len(cells), precision)
+    source_registers = hll_registers(hash_values(sources.to_numpy())[source_codes], cell_codes, len(cells), precision)
+
+    # Exact clients per (cell, source); each cell keeps its top ``capacity`` sources, the next count is its floor
+    per_source = (
+        pd.DataFrame({"part": cell_codes, "source": source_codes, "key": keys})
+        .drop_duplicates()
+        .groupby(["part", "source"], sort=False).size()
+        .rename("count").reset_index()
+        .sort_values(["part", "count"], ascending=[True, False], kind="stable")
+    )
+    rank = per_source.groupby("part").cumcount().to_numpy()
+    floors = np.zeros(len(cells), dtype=np.int64)
+    overflow = per_source[rank == capacity]
+    floors[overflow["part"].to_numpy()] = overflow["count"].to_numpy()
+    kept = per_source[rank < capacity]
+    heavy_hitters = pd.DataFrame({"count": kept["count"].to_numpy(), "error": 0, "part": kept["part"].to_numpy()},
+                                 index=pd.Index(sources[kept["source"].to_numpy()], name="source"))
+
+    return SketchCube(cells, client_registers, source_registers, heavy_hitters, floors, precision, capacity)
@@ -0,0 +1,74 @@
+"""
+Compare two exports of the same CRM data record by record.
+
+The CRM edits records retroactively (sources get reassigned, FTD dates appear
+for old leads). ``diff_snapshots`` hash-joins two processed dataframes on
+``Record ID`` and reports what changed, all with vectorized column operations
+so full-history exports diff in seconds.
+"""
+
+import pandas as pd
+
+from ftd_backend import get_backend
+
+RECORD_ID = "Record ID"
+
+
+def _prepare(df):
+    """Key columns of a processed dataframe under neutral names, one row per Record ID"""
+    frame = pd.DataFrame({
+        RECORD_ID: df[RECORD_ID],
+        "ftd_date": df[df.attrs.get("ftd_date_col", "portal - ftd_time")],
+        "ftd_month": df["ftd_month"],
+        "source": df[df.attrs.get("source_col", "portal - source_marketing_campaign")],
+    })
+    # Later rows win if an export repeats a Record ID, so the join stays one-to-one
+    return frame.drop_duplicates(RECORD_ID, keep="last")
+
+
+def _same(old, new):
+    """Element-wise equality that treats two missing values as equal"""
+    return (old == new) | (old.isna() & new.isna())
+
+
+def diff_snapshots(old_df, new_df, backend=None):
+    """
+    Diff two processed dataframes (as returned by load_df / load_upload).
+
+    Returns a dict of dataframes:
+    - ``added`` / ``removed``: records only present in the new / old export
+    - ``ftd_changed``: records whose FTD date changed (including newly appeared FTDs)
+    - ``source_changed``: records whose source was reassigned
+    - ``delta``: FTD client counts per (ftd_month, source) in both exports and the difference
+    """
+    backend = backend or get_backend()
+    old = _prepare(old_df)
+    new = _prepare(new_df)
+
+    joined = old.merge(new, on=RECORD_ID, how="outer", suffixes=("_old", "_new"), indicator=True)
+    both = joined[joined["_merge"] == "both"]
+
+    added = joined.loc[joined["_merge"] == "right_only", [RECORD_ID, "ftd_date_new", "source_new"]]
+    removed = joined.loc[joined["_merge"] == "left_only", [RECORD_ID, "ftd_date_old", "source_old"]]
+    ftd_changed = both.loc[
+        ~_same(both["ftd_date_old"], both["ftd_date_new"]),
+        [RECORD_ID, "ftd_date_old", "ftd_date_new", "source_new"],
+    ]
+    source_changed = both.loc[
+        ~_same(both["source_old"], both["source_new"]),
+        [RECORD_ID, "source_old", "source_new", "ftd_date_new"],
+    ]
+
+    old_counts = backend.count_by(old.dropna(subset=["ftd_month"]), ["ftd_month", "source"], name="clients_old")
+    new_counts = backend.count_by(new.dropna(subset=["ftd_month"]), ["ftd_month", "source"], name="clients_new")
+    delta = backend.merge_counts(old_counts, new_counts, ["ftd_month", "source"])
+    delta["delta"] = delta["clients_new"] - delta["clients_old"]
+    delta = delta[delta["delta"] != 0].reset_index(drop=True)
+
+    return {
+        "added": added.reset_index(drop=True),
+        "removed": removed.reset_index(drop=True),
+        "ftd_changed": ftd_changed.reset_index(drop=True),
+        "source_changed": source_changed.reset_index(drop=True),
+        "delta": delta,
+    }
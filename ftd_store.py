@@ -0,0 +1,187 @@
+"""
+Upload history for the FTD dashboard, kept in a local SQLite file.
+
+Every processed upload is stored as a snapshot (only the columns the dashboard
+uses, not the full CRM export) with indexes on Record ID and on month and
+source, so old exports can be reloaded or compared without the original CSV,
+and a snapshot can be opened for a month range (``month_counts`` lists its
+months, ``load_upload`` reads only the records in the range) without loading
+every record into pandas.
+
+The database path defaults to ``ftd_history.sqlite`` next to this file and can
+be changed with the ``FTD_DB_PATH`` environment variable.
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+from ftd_backend import CLIENT_KEY, client_keys
+
+DB_PATH_ENV_VAR = "FTD_DB_PATH"
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ftd_history.sqlite")
+
+# Table column -> (df.attrs key holding the actual column name, default column name)
+STORED_COLUMNS = {
+    "record_id": (None, "Record ID"),
+    "ftd_date": ("ftd_date_col", "portal - ftd_time"),
+    "kyc_date": ("kyc_date_col", "DATE_CREATED"),
+    "ftd_month": (None, "ftd_month"),
+    "kyc_month": (None, "kyc_month"),
+    "source": ("source_col", "portal - source_marketing_campaign"),
+    "country": ("country_col", "portal - country"),
+}
+DATE_COLUMNS = ["ftd_date", "kyc_date", "ftd_month", "kyc_month"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    upload_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    name        TEXT NOT NULL,
+    digest      TEXT NOT NULL UNIQUE,
+    uploaded_at TEXT NOT NULL,
+    row_count   INTEGER NOT NULL,
+    attrs       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    upload_id INTEGER NOT NULL REFERENCES uploads(upload_id) ON DELETE CASCADE,
+    record_id TEXT,
+    ftd_date  TEXT,
+    kyc_date  TEXT,
+    ftd_month TEXT,
+    kyc_month TEXT,
+    source    TEXT,
+    country   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_record_id ON records (upload_id, record_id);
+CREATE INDEX IF NOT EXISTS idx_records_ftd_month ON records (upload_id, ftd_month, source);
+CREATE INDEX IF NOT EXISTS idx_records_kyc_month ON records (upload_id, kyc_month, source);
+"""
+
+
+def get_db_path():
+    """Location of the history database"""
+    return os.environ.get(DB_PATH_ENV_VAR, DEFAULT_DB_PATH)
+
+
+def connect(path=None):
+    """Open the history database, creating the schema on first use"""
+    conn = sqlite3.connect(path or get_db_path())
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _column_names(attrs):
+    """Actual dataframe column name for every table column, resolved from df.attrs"""
+    return {column: attrs.get(key, default) if key else default for column, (key, default) in STORED_COLUMNS.items()}
+
+
+def _column_map(df):
+    """Map dataframe column names to table columns"""
+    return {name: column for column, name in _column_names(df.attrs).items()}
+
+
+def frame_digest(df):
+    """Stable content hash of the stored columns, used to skip re-saving the same export"""
+    columns = [c for c in _column_map(df) if c in df.columns]
+    hashed = pd.util.hash_pandas_object(df[columns], index=False)
+    return f"{len(df)}-{int(hashed.sum()) & 0xFFFFFFFFFFFFFFFF:016x}"
+
+
+def _month_column(month_col):
+    """Validate a month column name before it is interpolated into SQL"""
+    if month_col not in ("ftd_month", "kyc_month"):
+        raise ValueError(f"Unknown month column {month_col!r}; expected 'ftd_month' or 'kyc_month'")
+    return month_col
+
+
+def _stored_month(month):
+    """A month as the text stored in the month columns"""
+    return f"{pd.Timestamp(month):%Y-%m-%d %H:%M:%S}"
+
+
+def save_upload(df, name, path=None):
+    """Persist a processed dataframe as a snapshot; returns its upload_id (existing one if already saved)"""
+    digest = frame_digest(df)
+    column_map = _column_map(df)
+    records = df[[c for c in column_map if c in df.columns]].rename(columns=column_map)
+    for column in DATE_COLUMNS:
+        if column in records.columns:
+            records[column] = records[column].dt.strftime("%Y-%m-%d %H:%M:%S")
+    attrs = {k: (v.item() if hasattr(v, "item") else v) for k, v in df.attrs.items() if k != "diagnostics"}
+
+    with closing(connect(path)) as conn, conn:
+        existing = conn.execute("SELECT upload_id FROM uploads WHERE digest = ?", (digest,)).fetchone()
+        if existing:
+            return existing[0]
+        cursor = conn.execute(
+            "INSERT INTO uploads (name, digest, uploaded_at, row_count, attrs) VALUES (?, ?, ?, ?, ?)",
+            (name, digest, pd.Timestamp.now().isoformat(timespec="seconds"), len(df), json.dumps(attrs, default=str)),
+        )
+        upload_id = cursor.lastrowid
+        records.insert(0, "upload_id", upload_id)
+        records.to_sql("records", conn, if_exists="append", index=False, chunksize=50_000)
+    return upload_id
+
+
+def list_uploads(path=None):
+    """All saved snapshots, newest first"""
+    with closing(connect(path)) as conn:
+        return pd.read_sql_query(
+            "SELECT upload_id, name, uploaded_at, row_count FROM uploads ORDER BY upload_id DESC", conn
+        )
+
+
+def delete_upload(upload_id, path=None):
+    """Remove a snapshot and its records"""
+    with closing(connect(path)) as conn, conn:
+        conn.execute("DELETE FROM uploads WHERE upload_id = ?", (upload_id,))
+
+
+def month_counts(upload_id, month_col, path=None):
+    """Records per month of one snapshot, counted inside SQLite from the month index"""
+    month = _month_column(month_col)
+    with closing(connect(path)) as conn:
+        counts = pd.read_sql_query(
+            f"SELECT {month} AS month, COUNT(*) AS records FROM records "
+            f"WHERE upload_id = ? AND {month} IS NOT NULL GROUP BY {month} ORDER BY {month}",
+            conn, params=[upload_id], parse_dates=["month"],
+        )
+    return counts.rename(columns={"month": month_col})
+
+
+def load_upload(upload_id, month_cols=None, start=None, end=None, path=None):
+    """
+    Load a snapshot back into the same shape load_df returns.
+    When ``month_cols`` is given only records with a month in [start, end] in any of those columns are read
+    (through the month indexes); the load counts kept in the attrs still describe the whole snapshot.
+    """
+    query = "SELECT * FROM records WHERE upload_id = ?"
+    params = [upload_id]
+    if month_cols:
+        ranges = []
+        for month_col in month_cols:
+            month = _month_column(month_col)
+            ranges.append(f"{month} BETWEEN ? AND ?")
+            params += [_stored_month(start), _stored_month(end)]
+        query += f" AND ({' OR '.join(ranges)})"
+    query += " ORDER BY rowid"
+
+    with closing(connect(path)) as conn:
+        meta = conn.execute("SELECT attrs FROM uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+        if meta is None:
+            raise ValueError(f"Snapshot {upload_id} not found in {path or get_db_path()}")
+        records = pd.read_sql_query(query, conn, params=params, parse_dates=DATE_COLUMNS)
+
+    attrs = json.loads(meta[0])
+    names = _column_names(attrs)
+    df = records.drop(columns="upload_id").rename(columns=names)
+    for column in DATE_COLUMNS:
+        df[names[column]] = df[names[column]].astype("datetime64[ns]")
+    df[CLIENT_KEY] = client_keys(df[names["record_id"]])
+    df.attrs.update(attrs)
+    df.attrs["upload_id"] = upload_id
+    return df
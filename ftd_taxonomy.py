@@ -0,0 +1,145 @@
+"""
+Source taxonomy: maps marketing source names to category, channel, campaign and period.
+
+Rules live in ``source_taxonomy.json`` next to this file (override with the
+``FTD_TAXONOMY_PATH`` environment variable). They are tried in order and the
+first match wins; matching is case-insensitive. Each rule has a regex
+``pattern`` and output templates (``category``, ``channel``, ``campaign``,
+``period``) that may use ``{source}`` and the pattern's named groups, e.g.
+``Google_Campaign_Q1_2024`` -> Marketing / Google / period "Q1 2024".
+
+All rules are compiled into one combined regex, and every source name is
+classified once and memoized, so grouping stays fast however many rows share
+a source.
+"""
+
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+TAXONOMY_PATH_ENV_VAR = "FTD_TAXONOMY_PATH"
+DEFAULT_TAXONOMY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "source_taxonomy.json")
+
+# Output fields of every classification, and their defaults when the rules file does not set them
+TAXONOMY_FIELDS = ("category", "channel", "campaign", "period")
+DEFAULT_OUTPUT = {"category": "📢 Marketing", "channel": "Other Marketing", "campaign": "{source}", "period": ""}
+
+_GROUP_NAME = re.compile(r"\(\?P([<=])(\w+)")
+
+
+def _rule_pattern(index, pattern):
+    """A rule's pattern as one alternative of the combined regex, with its named groups made unique"""
+    prefixed = _GROUP_NAME.sub(lambda m: f"(?P{m.group(1)}r{index}__{m.group(2)}", pattern)
+    # The lazy prefix lets unanchored rules match anywhere while alternatives are still tried in rule order
+    return f"(?P<r{index}>.*?(?:{prefixed}))"
+
+
+class SourceTaxonomy:
+    """Ordered source rules compiled into a single matcher"""
+
+    def __init__(self, rules, default=None):
+        self.rules = list(rules)
+        self.default = {**DEFAULT_OUTPUT, **(default or {})}
+        for index, rule in enumerate(self.rules):
+            try:
+                re.compile(rule["pattern"])
+            except (KeyError, re.error) as e:
+                raise ValueError(f"Invalid taxonomy rule #{index + 1} ({rule.get('name', 'unnamed')}): {e}") from e
+        self._matcher = re.compile(
+            "|".join(_rule_pattern(i, rule["pattern"]) for i, rule in enumerate(self.rules)) or "(?!)",
+            re.IGNORECASE,
+        )
+        self._memo = {}
+        # Digest of the rules, so caches of classified data can be keyed on the rules they were built with
+        self.version = hashlib.blake2b(
+            json.dumps([self.rules, self.default], sort_keys=True, default=str).encode(), digest_size=8
+        ).hexdigest()
+
+    def classify(self, source):
+        """Category, channel, campaign and period of one source name (memoized)"""
+        result = self._memo.get(source)
+        if result is None:
+            result = self._memo[source] = self._classify(source)
+        return result
+
+    def _classify(self, source):
+        name = str(source).strip()
+        match = self._matcher.match(name)
+        if match is None:
+            rule, values = {}, {}
+        else:
+            index = int(match.lastgroup[1:])
+            rule = self.rules[index]
+            prefix = f"r{index}__"
+            values = {k[len(prefix):]: v or "" for k, v in match.groupdict().items() if k.startswith(prefix)}
+        values["source"] = name
+
+        result = {}
+        for field in TAXONOMY_FIELDS:
+            template = rule.get(field, self.default[field])
+            try:
+                result[field] = " ".join(template.format(**values).split())
+            except (KeyError, IndexError) as e:
+                raise ValueError(f"Taxonomy rule {rule.get('name', 'default')!r} uses unknown field {e} in {field!r}") from e
+        return result
+
+    def rule_summary(self):
+        """Channels each category is given by the rules, in rule order; the default category comes last"""
+        summary = {}
+        for rule in self.rules:
+            category = rule.get("category", self.default["category"])
+            summary.setdefault(category, []).append(rule.get("channel", self.default["channel"]))
+        summary.setdefault(self.default["category"], []).append(f"{self.default['channel']} (any other source)")
+        return {category: list(dict.fromkeys(channels)) for category, channels in summary.items()}
+
+    def classify_many(self, sources):
+        """Classification table for the given sources, evaluated once per unique name; indexed by source"""
+        unique = pd.unique(pd.Series(sources, dtype=object))
+        return pd.DataFrame([self.classify(s) for s in unique], index=pd.Index(unique, name="source"), columns=list(TAXONOMY_FIELDS))
+
+    def categorize(self, sources, field="category"):
+        """One taxonomy field for every element of a Series of source names (aligned with it)"""
+        return sources.map(self.classify_many(sources)[field])
+
+
+def load_taxonomy(path):
+    """Read and compile a rules file"""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+    return SourceTaxonomy(config.get("rules", []), config.get("default"))
+
+
+@lru_cache(maxsize=4)
+def _cached_taxonomy(path, mtime):
+    return load_taxonomy(path)
+
+
+def get_taxonomy(path=None):
+    """Compiled taxonomy for the configured rules file, rebuilt only when the file changes"""
+    path = path or os.environ.get(TAXONOMY_PATH_ENV_VAR, DEFAULT_TAXONOMY_PATH)
+    return _cached_taxonomy(path, os.path.getmtime(path))
+
+
+# Levels of the source hierarchy, from the top down
+HIERARCHY_LEVELS = ("category", "channel", "campaign")
+
+
+def build_hierarchy(cube, source_col, backend, taxonomy=None, dims=()):
+    """
+    Pre-aggregated counts for every level of the category -> channel -> campaign hierarchy.
+
+    ``cube`` is a rollup from build_rollups (month, period, source, *dims, clients). Returns a dict
+    level -> counts per (month, period, path down to that level, *dims), so expanding a level in the UI
+    only filters a small table.
+    """
+    taxonomy = taxonomy or get_taxonomy()
+    labels = taxonomy.classify_many(cube[source_col])
+    cube = cube.assign(**{level: cube[source_col].map(labels[level]) for level in HIERARCHY_LEVELS})
+    return {
+        level: backend.sum_by(cube, ["month", "period", *HIERARCHY_LEVELS[:depth + 1], *dims])
+        for depth, level in enumerate(HIERARCHY_LEVELS)
+    }
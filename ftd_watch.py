@@ -0,0 +1,130 @@
+"""
+Watched local data for the dashboard: export files on disk that are reloaded when they change.
+
+When nothing is uploaded the dashboard reads local exports instead - every
+export in the ``FTD_DATA_DIR`` directory, or ``source.csv`` (or a compressed
+variant) next to the app. A ``DataWatcher`` polls those files in a background
+thread: a file whose size or mtime changed is re-hashed, and only a real
+content change triggers a reload. Only the file digests are remembered between
+reloads (the raw parsed files are dropped once the dataset is built, so memory
+holds just the processed frame), and the new dataset replaces the old one in a
+single reference swap, so sessions keep serving the previous data while a
+reload runs and never see a half-built frame.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from ftd_ingest import UPLOAD_TYPES, dataset_key, file_digest, find_local_source, load_dataset
+
+logger = logging.getLogger("ftd.watch")
+
+DATA_DIR_ENV_VAR = "FTD_DATA_DIR"
+POLL_INTERVAL_ENV_VAR = "FTD_DATA_POLL_SECONDS"
+DEFAULT_POLL_SECONDS = 30
+
+
+def data_dir_files(directory):
+    """Export files in a directory (by upload extension), sorted by name (the file order duplicate Record IDs are resolved in)"""
+    extensions = tuple(f".{ext}" for ext in UPLOAD_TYPES)
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(extensions) and not name.startswith((".", "~$"))
+        and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def local_source_files(data_dir=None):
+    """Files the dashboard falls back to: every export in ``data_dir`` if set, else the first local source file"""
+    if data_dir:
+        return data_dir_files(data_dir)
+    source = find_local_source()
+    return [source] if source else []
+
+
+class DataSnapshot:
+    """One loaded version of the watched files"""
+
+    def __init__(self, df, files, digests, load_seconds=0.0):
+        self.df = df
+        self.files = files
+        self.digests = digests
+        self.key = dataset_key(list(digests.values()))
+        self.loaded_at = pd.Timestamp.now()
+        self.load_seconds = load_seconds
+
+
+class DataWatcher:
+    """Keeps the dataset for a set of local files current, reloading in a background thread"""
+
+    def __init__(self, list_files, backend=None, interval=DEFAULT_POLL_SECONDS):
+        self.list_files = list_files
+        self.backend = backend
+        self.interval = interval
+        self.snapshot = None
+        self.error = None
+        self._stats = {}   # path -> (size, mtime_ns, digest)
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Load in the background now (pre-warm) and keep polling for changes"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ftd-data-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+                self.error = None
+            except Exception as e:  # keep serving the last good snapshot
+                logger.warning("Reloading local data failed: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+                self.error = e
+            self._ready.set()
+            self._stop.wait(self.interval)
+
+    def wait(self, timeout=None):
+        """Current snapshot, blocking only until the first load has finished (None if there is no data)"""
+        self._ready.wait(timeout)
+        return self.snapshot
+
+    def _digest(self, path):
+        """Content digest of a file, re-hashed only when its size or mtime changed"""
+        stat = os.stat(path)
+        cached = self._stats.get(path)
+        if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+        digest = file_digest(path)
+        self._stats[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+    def refresh(self):
+        """Reload if the watched files changed; returns True when a new snapshot was swapped in"""
+        with self._refresh_lock:
+            files = tuple(self.list_files())
+            digests = {path: self._digest(path) for path in files}
+            current = self.snapshot
+            if current is not None and current.files == files and current.digests == digests:
+                return False
+            if not files:
+                self.snapshot = None
+                return current is not None
+
+            started = time.perf_counter()
+            df = load_dataset(list(files), self.backend)
+            # Forget files that are gone, then swap the new dataset in with one assignment
+            self._stats = {path: self._stats[path] for path in files}
+            self.snapshot = DataSnapshot(df, files, digests, load_seconds=time.perf_counter() - started)
+            logger.info("Loaded %d rows from %s in %.2fs", len(df), ", ".join(files), self.snapshot.load_seconds)
+            return True
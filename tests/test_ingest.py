@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from ftd_ingest import DUPLICATE_FLAG, load_dataset
+
+HEADER = "Record ID,portal - ftd_time,DATE_CREATED,portal - source_marketing_campaign,portal - country\n"
+
+
+@pytest.fixture
+def two_files(tmp_path):
+    """Record 1 has an FTD in the first file and a blank FTD in the second"""
+    first = tmp_path / "r1.csv"
+    first.write_text(HEADER + "1,15/03/2024,01/03/2024,IB_A,CY\n2,,02/03/2024,Google,GR\n")
+    second = tmp_path / "r2.csv"
+    second.write_text(HEADER + "1,,05/03/2024,Facebook,CY\n")
+    return [str(first), str(second)]
+
+
+def test_cross_file_duplicates_latest_ftd(two_files):
+    df = load_dataset(two_files, duplicate_policy="latest_ftd")
+    row = df[df["Record ID"] == "1"]
+    assert len(row) == 1
+    assert row["portal - ftd_time"].iloc[0] == pd.Timestamp("2024-03-15")
+    assert df.attrs["duplicates"]["duplicate_ids"] == 1
+    assert df.attrs["duplicates"]["removed"] == 1
+    assert [s["duplicates_removed"] for s in df.attrs["file_stats"]] == [0, 1]
+
+
+def test_cross_file_duplicates_first(two_files):
+    df = load_dataset(two_files, duplicate_policy="first")
+    row = df[df["Record ID"] == "1"]
+    assert len(row) == 1
+    assert row["portal - source_marketing_campaign"].iloc[0] == "IB_A"
+    assert [s["duplicates_removed"] for s in df.attrs["file_stats"]] == [0, 1]
+
+
+def test_cross_file_duplicates_flag(two_files):
+    df = load_dataset(two_files, duplicate_policy="flag")
+    rows = df[df["Record ID"] == "1"]
+    assert len(rows) == 2
+    assert rows[DUPLICATE_FLAG].all()
+    assert df.attrs["duplicates"]["duplicate_ids"] == 1
+    assert df.attrs["duplicates"]["removed"] == 0
+    assert "_part" not in df.columns